@@ -64,6 +64,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.navbar_badges",
             ],
         },
     },
@@ -134,7 +135,39 @@ AUTH_USER_MODEL = 'core.User'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 导出文件（含学生成绩）的存储目录，不在 MEDIA_ROOT 下，不能由 Web 服务器直接对外提供
+PRIVATE_EXPORT_ROOT = BASE_DIR / 'private_exports'
+
 # 登录相关设置
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
+
+# 缓存设置
+# view_counts 用于浏览次数写回缓冲，多 worker 部署时建议改为 Redis 等共享缓存
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "view_counts": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "view-counts",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+# 浏览次数写回设置
+VIEW_COUNT_CACHE_ALIAS = "view_counts"
+VIEW_COUNT_FLUSH_INTERVAL = 60  # 秒；为 0 时请求中不写回，只由 flush_view_counters 命令写回
+
+# 讨论区正文渲染缓存：共享缓存别名、进程内 LRU 容量、共享缓存有效期（秒）
+RENDER_CACHE_ALIAS = "default"
+RENDER_CACHE_LRU_SIZE = 1000
+RENDER_CACHE_TIMEOUT = 7 * 24 * 3600
+
+# 讨论区热度半衰期（小时）
+HOT_SCORE_HALF_LIFE_HOURS = 24
+
+# 后台导出任务：python manage.py run_export_jobs 的并行任务数和轮询间隔（秒）
+EXPORT_JOB_WORKERS = 2
+EXPORT_JOB_POLL_INTERVAL = 5
@@ -61,6 +61,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.navbar_badges",
             ],
         },
     },
@@ -122,6 +123,9 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 导出文件（含学生成绩）的存储目录，不在 MEDIA_ROOT 下，不能由 Web 服务器直接对外提供
+PRIVATE_EXPORT_ROOT = BASE_DIR / 'private_exports'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -195,14 +199,46 @@ LOGGING = {
     },
 }
 
-# 缓存配置（可选）
+# 缓存配置
+# view_counts 用于浏览次数写回缓冲。默认每个 worker 进程各自缓冲并按间隔写回；
+# 启用 Redis 后各 worker 共用缓冲，可用 `python manage.py flush_view_counters --loop` 集中写回
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'view_counts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'view-counts',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
 # CACHES = {
 #     'default': {
 #         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
 #         'LOCATION': 'redis://127.0.0.1:6379/1',
-#     }
+#     },
+#     'view_counts': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/2',
+#     },
 # }
 
+# 浏览次数写回间隔（秒）
+VIEW_COUNT_CACHE_ALIAS = 'view_counts'
+VIEW_COUNT_FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 60))
+
+# 讨论区正文渲染缓存：共享缓存别名、进程内 LRU 容量、共享缓存有效期（秒）
+RENDER_CACHE_ALIAS = 'default'
+RENDER_CACHE_LRU_SIZE = int(os.environ.get('RENDER_CACHE_LRU_SIZE', 1000))
+RENDER_CACHE_TIMEOUT = 7 * 24 * 3600
+
+# 讨论区热度半衰期（小时），修改后执行 python manage.py rebuild_hot_scores
+HOT_SCORE_HALF_LIFE_HOURS = int(os.environ.get('HOT_SCORE_HALF_LIFE_HOURS', 24))
+
+# 后台导出任务在 gunicorn 之外执行：python manage.py run_export_jobs --loop
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+EXPORT_JOB_POLL_INTERVAL = int(os.environ.get('EXPORT_JOB_POLL_INTERVAL', 5))
+
 # 邮件配置（用于发送通知）
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 # EMAIL_HOST = 'smtp.gmail.com'
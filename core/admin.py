@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User, TeacherProfile, StudentProfile, Class, TeachingClass, VideoResource, ForumCategory, ForumPost, ForumReply, ForumLike, PostReadStatus, Assignment, Question, StudentSubmission
+from .grading import auto_grade_assignment
+from .models import User, TeacherProfile, StudentProfile, Class, TeachingClass, VideoResource, ForumCategory, ForumPost, ForumReply, ForumLike, PostReadStatus, Assignment, Question, StudentSubmission, UserCounters, ExportJob
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -152,15 +153,12 @@ class VideoResourceAdmin(admin.ModelAdmin):
 @admin.register(ForumCategory)
 class ForumCategoryAdmin(admin.ModelAdmin):
     """讨论区分类管理"""
-    list_display = ('name', 'icon', 'order', 'is_active', 'post_count', 'created_at')
+    list_display = ('name', 'icon', 'order', 'is_active', 'post_count', 'last_post_at', 'created_at')
     list_filter = ('is_active', 'created_at')
     search_fields = ('name', 'description')
     list_editable = ('order', 'is_active')
     ordering = ('order', 'name')
-    
-    def post_count(self, obj):
-        return obj.forumpost_set.count()
-    post_count.short_description = '帖子数量'
+    readonly_fields = ('post_count', 'last_post_at', 'last_post')
 
 
 @admin.register(ForumPost)
@@ -284,6 +282,18 @@ class PostReadStatusAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(UserCounters)
+class UserCountersAdmin(admin.ModelAdmin):
+    """用户计数查看（由系统自动维护，可用 rebuild_user_counters 命令重建）"""
+    list_display = ('user', 'unread_private_messages', 'unread_replies', 'pending_assignments', 'updated_at')
+    list_filter = ('user__user_type',)
+    search_fields = ('user__real_name', 'user__username')
+    readonly_fields = ('user', 'unread_private_messages', 'unread_replies', 'pending_assignments', 'updated_at')
+    
+    def has_add_permission(self, request):
+        return False
+
+
 # ==================== 作业系统管理 ====================
 
 @admin.register(Assignment)
@@ -294,6 +304,7 @@ class AssignmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'chapter', 'teaching_class', 'publish_time', 'due_time', 'created_by')
     search_fields = ('title', 'description')
     readonly_fields = ('submission_count', 'graded_count', 'created_at', 'updated_at')
+    actions = ['auto_grade']
     
     fieldsets = (
         ('基本信息', {
@@ -311,6 +322,12 @@ class AssignmentAdmin(admin.ModelAdmin):
         }),
     )
     
+    @admin.action(description='客观题自动判分')
+    def auto_grade(self, request, queryset):
+        for assignment in queryset:
+            result = auto_grade_assignment(assignment, graded_by=request.user)
+            self.message_user(request, f'{assignment.title}：{result}')
+    
     def submission_count(self, obj):
         return obj.studentsubmission_set.count()
     submission_count.short_description = '提交人数'
@@ -420,4 +437,16 @@ class StudentSubmissionAdmin(admin.ModelAdmin):
             grade_text,
             percentage
         )
-    grade_display.short_description = '等级'
\ No newline at end of file
+    grade_display.short_description = '等级'
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """后台导出任务查看（由 run_export_jobs 命令执行）"""
+    list_display = ('id', 'created_by', 'assignment', 'teaching_class', 'export_format', 'status',
+                    'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'export_format', 'created_at')
+    search_fields = ('created_by__real_name', 'assignment__title', 'teaching_class__name')
+    readonly_fields = ('status', 'progress', 'output_file', 'error_message', 'created_at',
+                       'started_at', 'finished_at')
+    raw_id_fields = ('created_by', 'assignment', 'teaching_class')
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.core import checks
+
+        from . import signals  # noqa: F401
+        from .view_counters import check_cache_settings
+        checks.register(check_cache_settings, checks.Tags.caches)
@@ -0,0 +1,102 @@
+"""
+教学班作业存档（zip）
+
+存档包含教学班内每个有已批改提交的作业的 CSV 成绩单和 JSON 存档，
+各文件在写入 zip 时才逐个生成，边压缩边发送，不使用临时文件。
+
+存档按内容版本缓存：版本号由作业、题目和提交的几项聚合值计算，只需几条聚合查询。
+首次下载时边发送边写入私有存储（PRIVATE_EXPORT_ROOT/archives/，见 storage.py），
+完整写完才生效，并删除该班的旧版本；
+内容未变化时再次下载直接发送缓存文件，浏览器带 If-None-Match 时返回 304。
+版本号只覆盖作业、题目和提交数据，学生改名等不会使缓存失效。
+"""
+import hashlib
+import os
+import uuid
+
+from django.db.models import Count, Max, Sum
+
+from .exports import archive_member_name, exportable_assignments, iter_export
+from .models import Assignment, Question, QuestionScore, StudentSubmission
+from .storage import private_export_storage
+
+# 存档内容格式的版本，调整导出内容时加一，旧缓存随之失效
+ARCHIVE_FORMAT_VERSION = 1
+ARCHIVE_DIR = 'archives'
+ARCHIVE_FORMATS = ('csv', 'json')
+
+
+def archive_version(teaching_class, assignment_ids):
+    """教学班存档的内容版本（数据不变时不变）"""
+    submissions = StudentSubmission.objects.filter(
+        assignment__in=assignment_ids, is_submitted=True, is_graded=True
+    )
+    state = (
+        ARCHIVE_FORMAT_VERSION,
+        teaching_class.name,
+        list(Assignment.objects.filter(pk__in=assignment_ids).order_by('id').values_list('id', 'updated_at')),
+        list(Question.objects.filter(assignment__in=assignment_ids).values('assignment_id').annotate(
+            count=Count('id'), total=Sum('score'), last_id=Max('id')
+        ).order_by('assignment_id').values_list('assignment_id', 'count', 'total', 'last_id')),
+        list(submissions.values('assignment_id').annotate(
+            count=Count('id'), total=Sum('score'), last_id=Max('id'), graded_at=Max('graded_at')
+        ).order_by('assignment_id').values_list('assignment_id', 'count', 'total', 'last_id', 'graded_at')),
+        list(QuestionScore.objects.filter(submission__in=submissions).values('submission__assignment_id').annotate(
+            count=Count('id'), total=Sum('score')
+        ).order_by('submission__assignment_id').values_list('submission__assignment_id', 'count', 'total')),
+    )
+    return hashlib.sha256(repr(state).encode('utf-8')).hexdigest()[:20]
+
+
+def class_archive(teaching_class):
+    """返回 (要打包的作业查询集, 内容版本)；没有可导出的作业时版本为 None"""
+    assignments = exportable_assignments(teaching_class).select_related('teaching_class', 'created_by')
+    assignment_ids = list(assignments.values_list('id', flat=True))
+    if not assignment_ids:
+        return assignments, None
+    return assignments, archive_version(teaching_class, assignment_ids)
+
+
+def iter_class_archive_members(assignments):
+    """逐个产出 (文件名, 字节块迭代器)：每个作业一份 CSV 和一份 JSON，遍历到时才生成"""
+    for assignment in assignments:
+        for export_format in ARCHIVE_FORMATS:
+            yield archive_member_name(assignment, export_format), iter_export(assignment, export_format)
+
+
+class ArchiveCache:
+    """按教学班和内容版本保存的存档文件"""
+
+    def __init__(self, teaching_class_id, version, storage=None):
+        self.storage = storage or private_export_storage()
+        self.prefix = f'class_{teaching_class_id}_'
+        self.name = f'{ARCHIVE_DIR}/{self.prefix}{version}.zip'
+
+    def open(self):
+        """打开缓存文件；文件不存在（或刚被其他请求的 prune 删除）时抛出 FileNotFoundError"""
+        return self.storage.open(self.name, 'rb')
+
+    def tee(self, chunks):
+        """原样产出字节块，同时写入缓存；完整写完才改名生效，中途断开则删除未完成的文件"""
+        path = self.storage.path(self.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{uuid.uuid4().hex}.partial'
+        try:
+            with open(partial, 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    yield chunk
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, path)
+        self.prune()
+
+    def prune(self):
+        """删除该教学班其他版本的存档"""
+        current = os.path.basename(self.name)
+        _, files = self.storage.listdir(ARCHIVE_DIR)
+        for filename in files:
+            if filename.startswith(self.prefix) and filename.endswith('.zip') and filename != current:
+                self.storage.delete(f'{ARCHIVE_DIR}/{filename}')
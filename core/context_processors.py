@@ -0,0 +1,9 @@
+from .counters import get_badge_counts
+
+
+def navbar_badges(request):
+    """向模板注入导航栏角标计数（未登录用户不注入）"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'navbar_badges': get_badge_counts(request)}
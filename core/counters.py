@@ -0,0 +1,174 @@
+"""
+导航栏角标计数服务
+
+教师的未读私信数、学生的未读回复数和未完成作业数都用固定条数的聚合查询算出，
+查询次数与帖子数、作业数无关。计算结果写入 UserCounters 表，由 signals 在相关数据
+变化时刷新，导航栏每次请求只需读取一行。
+"""
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.functional import cached_property
+
+from .models import (
+    Assignment, ForumPost, PostReadStatus, StudentSubmission, User, UserCounters,
+)
+
+COUNTER_FIELDS = ['unread_private_messages', 'unread_replies', 'pending_assignments']
+
+
+def unread_private_messages_count(user):
+    """教师未读私信数量：任课教学班内尚无任何回复的私信帖子"""
+    if user.user_type != 'teacher':
+        return 0
+    return ForumPost.objects.filter(
+        visibility='teacher_only',
+        reply_count=0,
+        teaching_class__created_by=user,
+    ).count()
+
+
+def unread_replies_count(user):
+    """学生未读回复数量：各帖子（总回复数 - 已读回复数）之和"""
+    if user.user_type != 'student':
+        return 0
+    read_count = PostReadStatus.objects.filter(
+        user=user, post=OuterRef('pk')
+    ).values('read_replies_count')[:1]
+    result = ForumPost.objects.filter(author=user).annotate(
+        unread=Greatest(
+            F('reply_count') - Coalesce(Subquery(read_count), Value(0)),
+            Value(0),
+        )
+    ).aggregate(total=Sum('unread'))
+    return result['total'] or 0
+
+
+def pending_assignments_count(user):
+    """学生未完成作业数量：所在教学班已发布、且没有任何提交记录（含草稿）的作业"""
+    if user.user_type != 'student':
+        return 0
+    submitted = StudentSubmission.objects.filter(
+        assignment=OuterRef('pk'), student=user
+    )
+    return Assignment.objects.filter(
+        teaching_class__studentprofile__user=user,
+        status='published',
+    ).exclude(Exists(submitted)).count()
+
+
+def compute_user_counters(user_ids):
+    """批量计算多个用户的计数，返回 {user_id: {字段: 值}}（三条分组查询）"""
+    user_ids = list(user_ids)
+    counters = {
+        user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids
+    }
+    if not user_ids:
+        return counters
+
+    # 教师：未回复私信按任课教师分组
+    private_rows = ForumPost.objects.filter(
+        visibility='teacher_only',
+        reply_count=0,
+        teaching_class__created_by__in=user_ids,
+        teaching_class__created_by__user_type='teacher',
+    ).values('teaching_class__created_by').annotate(total=Count('id'))
+    for row in private_rows:
+        counters[row['teaching_class__created_by']]['unread_private_messages'] = row['total']
+
+    # 学生：未读回复按作者分组
+    read_count = PostReadStatus.objects.filter(
+        user=OuterRef('author'), post=OuterRef('pk')
+    ).values('read_replies_count')[:1]
+    reply_rows = ForumPost.objects.filter(
+        author__in=user_ids,
+        author__user_type='student',
+    ).annotate(
+        unread=Greatest(
+            F('reply_count') - Coalesce(Subquery(read_count), Value(0)),
+            Value(0),
+        )
+    ).values('author').annotate(total=Sum('unread')).order_by()
+    for row in reply_rows:
+        counters[row['author']]['unread_replies'] = row['total'] or 0
+
+    # 学生：未提交作业按学生分组
+    submitted = StudentSubmission.objects.filter(
+        assignment=OuterRef('pk'), student=OuterRef('student_id')
+    )
+    pending_rows = Assignment.objects.filter(
+        status='published',
+        teaching_class__studentprofile__user__in=user_ids,
+        teaching_class__studentprofile__user__user_type='student',
+    ).annotate(
+        student_id=F('teaching_class__studentprofile__user')
+    ).exclude(Exists(submitted)).values('student_id').annotate(total=Count('id')).order_by()
+    for row in pending_rows:
+        counters[row['student_id']]['pending_assignments'] = row['total']
+
+    return counters
+
+
+def refresh_user_counters(user_ids):
+    """重新计算并写入指定用户的计数（单条 upsert）"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return []
+    counters = compute_user_counters(user_ids)
+    return UserCounters.objects.bulk_create(
+        [UserCounters(user_id=user_id, **values) for user_id, values in counters.items()],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=COUNTER_FIELDS + ['updated_at'],
+    )
+
+
+def rebuild_user_counters(batch_size=500):
+    """全量重建所有用户的计数，返回处理的用户数"""
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        refresh_user_counters(user_ids[start:start + batch_size])
+    return len(user_ids)
+
+
+def get_user_counters(user):
+    """读取用户计数行，不存在时即时计算并写入"""
+    row = UserCounters.objects.filter(user=user).first()
+    if row is None:
+        row = refresh_user_counters([user.pk])[0]
+    return row
+
+
+class BadgeCounts:
+    """单个请求内的角标计数，首次访问时读取一行 UserCounters"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _row(self):
+        return get_user_counters(self.user)
+
+    @property
+    def unread_private_messages(self):
+        return self._row.unread_private_messages
+
+    @property
+    def unread_replies(self):
+        return self._row.unread_replies
+
+    @property
+    def pending_assignments(self):
+        return self._row.pending_assignments
+    
+    def refresh(self):
+        """重新计算并写入计数，本请求随后读取到的是新值"""
+        self.__dict__['_row'] = refresh_user_counters([self.user.pk])[0]
+
+
+def get_badge_counts(request):
+    """获取当前请求的角标计数（同一请求内多次渲染共用一个实例）"""
+    badges = getattr(request, '_badge_counts', None)
+    if badges is None:
+        badges = BadgeCounts(request.user)
+        request._badge_counts = badges
+    return badges
@@ -0,0 +1,98 @@
+"""
+后台导出任务的执行
+
+教师提交的 ExportJob 由 run_export_jobs 命令在 Web 进程之外执行：
+导出内容先写入临时文件，完成后以随机文件名保存到私有存储（ExportJob.output_file，见 storage.py），
+只能通过需要登录的下载视图获取。
+单个作业导出为对应格式的文件，教学班导出为包含每个作业文件的 zip 包。
+
+进度为已写出的提交数占全部已批改提交数的百分比，由导出生成函数的 progress 回调驱动，
+百分比变化时才写数据库；完成前最多显示 99%。
+"""
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.utils import timezone
+
+from .exports import exportable_assignments, iter_archive_members, iter_export
+from .models import Assignment, ExportJob, StudentSubmission
+from .zipstream import iter_zip
+
+logger = logging.getLogger(__name__)
+
+
+def get_worker_count():
+    return getattr(settings, 'EXPORT_JOB_WORKERS', 2)
+
+
+def get_poll_interval():
+    return getattr(settings, 'EXPORT_JOB_POLL_INTERVAL', 5)
+
+
+class ProgressTracker:
+    """累计已写出的提交数并换算为任务进度"""
+
+    def __init__(self, job, total):
+        self.job = job
+        self.total = total
+        self.done = 0
+
+    def __call__(self, count):
+        self.done += count
+        if self.total:
+            self.job.set_progress(min(self.done * 100 // self.total, 99))
+
+
+def job_assignments(job):
+    """任务要导出的作业"""
+    queryset = Assignment.objects.select_related('teaching_class', 'created_by')
+    if job.assignment_id:
+        return list(queryset.filter(pk=job.assignment_id))
+    return list(exportable_assignments(job.teaching_class).select_related('teaching_class', 'created_by'))
+
+
+def run_export_job(job):
+    """执行一个已领取（状态为导出中）的任务，结果和错误都记录在任务上，不向外抛出异常"""
+    try:
+        assignments = job_assignments(job)
+        total = StudentSubmission.objects.filter(
+            assignment__in=[assignment.id for assignment in assignments],
+            is_submitted=True, is_graded=True
+        ).count()
+        progress = ProgressTracker(job, total)
+
+        with tempfile.TemporaryFile() as output:
+            if job.assignment_id:
+                for chunk in iter_export(assignments[0], job.export_format, progress):
+                    output.write(chunk)
+            else:
+                for chunk in iter_zip(iter_archive_members(assignments, job.export_format, progress)):
+                    output.write(chunk)
+            output.seek(0)
+            job.output_file.save(f'export.{job.file_extension}', File(output), save=False)
+
+        job.status = 'done'
+        job.progress = 100
+    except Exception as exc:
+        logger.exception('导出任务 %s 执行失败', job.pk)
+        job.status = 'failed'
+        job.error_message = str(exc) or exc.__class__.__name__
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'output_file', 'error_message', 'finished_at'])
+    return job
+
+
+def run_claimed_job(job):
+    """在工作线程中执行任务，结束后关闭本线程的数据库连接"""
+    try:
+        return run_export_job(job)
+    finally:
+        connection.close()
+
+
+def requeue_running_jobs():
+    """把仍处于导出中的任务退回队列（worker 异常退出后重启时使用），返回任务数"""
+    return ExportJob.objects.filter(status='running').update(status='queued', progress=0, started_at=None)
@@ -0,0 +1,331 @@
+"""
+作业数据导出
+
+导出内容由生成器逐行产出，配合 StreamingHttpResponse 边查询边发送：
+已批改的提交按 id 每 CHUNK_SIZE 条分批读取，学生档案随提交一并 join，
+每批提交的题目得分只查询一次。内存占用与提交数量无关，响应头发出后即开始传输。
+
+成绩单有 CSV 和 XLSX 两种格式，每行为一名学生的基本信息和逐题得分；
+XLSX 另有一张汇总表，统计在写成绩矩阵时顺带累计，数据只需遍历一遍。
+
+JSON 存档依次写出作业信息、题目，再逐条写出提交；JSON Lines 每行一条记录，
+以 type 字段区分 assignment / question / submission。
+
+各生成函数都接受 progress 回调，每写完一批提交以这批的数量调用一次，供后台导出任务汇报进度。
+"""
+import csv
+import json
+import re
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import QuestionScore
+from .xlsx import CONTENT_TYPE as XLSX_CONTENT_TYPE, StreamingXLSXWriter
+
+CHUNK_SIZE = 500
+
+# CSV 开头的 UTF-8 BOM，Excel 据此识别中文编码
+CSV_BOM = '\ufeff'
+
+GRADEBOOK_HEADER = [
+    '序号', '学号', '姓名', '总分', '得分', '得分率(%)',
+    '提交时间', '批改时间', '批改教师', '是否逾期', '教师评语',
+]
+
+
+class Echo:
+    """供 csv.writer 使用的伪文件对象：write 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+def graded_submissions(assignment):
+    """作业的已批改提交，学生档案和批改教师一并 join"""
+    return assignment.studentsubmission_set.filter(
+        is_submitted=True, is_graded=True
+    ).select_related('student__studentprofile', 'graded_by').order_by('id')
+
+
+def _attach_scores(assignment, submissions):
+    """一次查询读取这批提交的题目得分，逐条产出 (提交, {题目ID: 得分记录})"""
+    scores = defaultdict(dict)
+    for question_score in QuestionScore.objects.filter(
+        submission__in=[submission.id for submission in submissions]
+    ).order_by('id').values('submission_id', 'question_id', 'score', 'teacher_comment'):
+        scores[question_score.pop('submission_id')][question_score['question_id']] = question_score
+    for submission in submissions:
+        # 各提交共用同一个作业对象，避免访问 submission.assignment 时逐条查询
+        submission.assignment = assignment
+        yield submission, scores[submission.id]
+
+
+def iter_graded_submissions(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    分批遍历已批改的提交，逐条产出 (提交, {题目ID: 得分记录})，
+    得分记录为 {'question_id', 'score', 'teacher_comment'} 字典。
+    progress 为可选的回调，每写完一批以这批的提交数调用一次
+    """
+    queryset = graded_submissions(assignment)
+    last_id = 0
+    while True:
+        # 每批是一条独立的短查询，两批之间不保留打开的游标：
+        # SQLite 中未结束的读语句会阻塞其他连接写入，下载较慢时也不能一直占着
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        yield from _attach_scores(assignment, chunk)
+        if progress is not None:
+            progress(len(chunk))
+        if len(chunk) < chunk_size:
+            break
+        last_id = chunk[-1].id
+
+
+def student_number(student):
+    """学生学号，没有学生档案时使用用户名"""
+    profile = getattr(student, 'studentprofile', None)
+    return profile.student_id if profile is not None else student.username
+
+
+def format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def gradebook_questions(assignment):
+    """成绩单的题目列：[(题目ID, 分值), ...]"""
+    return list(assignment.questions.order_by('order', 'id').values_list('id', 'score'))
+
+
+def percentage(score, total_score):
+    return round(score / total_score * 100, 1) if total_score > 0 else 0
+
+
+def iter_gradebook_rows(assignment, questions, chunk_size=CHUNK_SIZE, summary=None, progress=None):
+    """逐行产出成绩单（值列表），第一行为表头；传入 summary 时同时累计统计"""
+    yield GRADEBOOK_HEADER + [
+        f'第{index}题({score}分)' for index, (question_id, score) in enumerate(questions, 1)
+    ]
+
+    total_score = assignment.total_score
+    submissions = iter_graded_submissions(assignment, chunk_size, progress)
+    for index, (submission, scores) in enumerate(submissions, 1):
+        if summary is not None:
+            summary.add(submission, scores)
+        score = submission.score or 0
+        row = [
+            index,
+            student_number(submission.student),
+            submission.student.real_name,
+            total_score,
+            score,
+            percentage(score, total_score),
+            format_time(submission.submit_time),
+            format_time(submission.graded_at),
+            submission.graded_by.real_name if submission.graded_by else '',
+            '是' if submission.is_late else '否',
+            submission.teacher_comments or '',
+        ]
+        row.extend(
+            scores[question_id]['score'] if question_id in scores else ''
+            for question_id, _ in questions
+        )
+        yield row
+
+
+def iter_gradebook_csv(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    """逐行产出作业成绩单 CSV（字符串），第一行带 BOM，基本信息之后为每题得分"""
+    writer = csv.writer(Echo())
+
+    yield CSV_BOM + writer.writerow([f'作业：{assignment.title}'])
+    yield writer.writerow([f'教学班：{assignment.teaching_class.name}'])
+    yield writer.writerow([f'导出时间：{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}'])
+    yield writer.writerow([])
+    for row in iter_gradebook_rows(assignment, gradebook_questions(assignment), chunk_size, progress=progress):
+        yield writer.writerow(row)
+
+
+class GradebookSummary:
+    """写成绩矩阵时顺带累计的汇总统计"""
+
+    def __init__(self, assignment, questions):
+        self.assignment = assignment
+        self.questions = questions
+        self.count = 0
+        self.late = 0
+        self.total = 0
+        self.highest = None
+        self.lowest = None
+        self.question_totals = dict.fromkeys((question_id for question_id, _ in questions), 0)
+
+    def add(self, submission, scores):
+        score = submission.score or 0
+        self.count += 1
+        self.late += submission.is_late
+        self.total += score
+        self.highest = score if self.highest is None else max(self.highest, score)
+        self.lowest = score if self.lowest is None else min(self.lowest, score)
+        for question_id, question_score in scores.items():
+            if question_id in self.question_totals:
+                self.question_totals[question_id] += question_score['score'] or 0
+
+    def rows(self):
+        assignment = self.assignment
+        average = round(self.total / self.count, 1) if self.count else 0
+        yield ['作业', assignment.title]
+        yield ['教学班', assignment.teaching_class.name]
+        yield ['导出时间', timezone.now().strftime('%Y-%m-%d %H:%M:%S')]
+        yield ['总分', assignment.total_score]
+        yield []
+        yield ['已批改提交', self.count]
+        yield ['平均分', average]
+        yield ['平均得分率(%)', percentage(average, assignment.total_score)]
+        yield ['最高分', self.highest]
+        yield ['最低分', self.lowest]
+        yield ['逾期提交', self.late]
+        yield []
+        yield ['题目', '分值', '平均得分', '得分率(%)']
+        for index, (question_id, score) in enumerate(self.questions, 1):
+            question_average = round(self.question_totals[question_id] / self.count, 2) if self.count else 0
+            yield [f'第{index}题', score, question_average, percentage(question_average, score)]
+
+
+def iter_gradebook_xlsx(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    逐块产出作业成绩单 XLSX（字节）：先写成绩矩阵并累计统计，再写汇总表，
+    汇总表在工作簿中排在第一位
+    """
+    questions = gradebook_questions(assignment)
+    summary = GradebookSummary(assignment, questions)
+    writer = StreamingXLSXWriter()
+    yield from writer.write_sheet(
+        '成绩矩阵', iter_gradebook_rows(assignment, questions, chunk_size, summary, progress), position=1
+    )
+    yield from writer.write_sheet('汇总', summary.rows(), position=0)
+    yield from writer.finish()
+
+
+# ==================== JSON 存档 ====================
+
+def assignment_data(assignment):
+    return {
+        'id': assignment.id,
+        'title': assignment.title,
+        'description': assignment.description,
+        'teaching_class': assignment.teaching_class.name,
+        'chapter': assignment.chapter,
+        'total_score': assignment.total_score,
+        'publish_time': isoformat(assignment.publish_time),
+        'due_time': isoformat(assignment.due_time),
+        'created_by': assignment.created_by.real_name,
+        'export_time': timezone.now().isoformat(),
+    }
+
+
+def iter_question_data(assignment):
+    for question in assignment.questions.order_by('order', 'id'):
+        yield {
+            'id': question.id,
+            'order': question.order,
+            'content': question.content,
+            'question_type': question.question_type,
+            'difficulty': question.difficulty,
+            'options': question.options,
+            'correct_answer': question.correct_answer,
+            'explanation': question.explanation,
+            'score': question.score,
+        }
+
+
+def iter_submission_data(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    for submission, scores in iter_graded_submissions(assignment, chunk_size, progress):
+        yield {
+            'student': {
+                'id': submission.student_id,
+                'student_id': student_number(submission.student),
+                'real_name': submission.student.real_name,
+            },
+            'answers': submission.answers,
+            'score': submission.score,
+            'submit_time': isoformat(submission.submit_time),
+            'is_late': submission.is_late,
+            'teacher_comments': submission.teacher_comments,
+            'graded_by': submission.graded_by.real_name if submission.graded_by else None,
+            'graded_at': isoformat(submission.graded_at),
+            'question_scores': list(scores.values()),
+        }
+
+
+def dumps(data, **kwargs):
+    return json.dumps(data, ensure_ascii=False, **kwargs)
+
+
+def _iter_json_array(items):
+    """逐项写出 JSON 数组的元素，每项一行"""
+    separator = '\n'
+    for item in items:
+        yield separator + dumps(item)
+        separator = ',\n'
+
+
+def iter_archive_json(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    """逐段产出作业 JSON 存档：{"assignment": ..., "questions": [...], "submissions": [...]}"""
+    yield '{"assignment": ' + dumps(assignment_data(assignment), indent=2)
+    yield ',\n"questions": ['
+    yield from _iter_json_array(iter_question_data(assignment))
+    yield '\n],\n"submissions": ['
+    yield from _iter_json_array(iter_submission_data(assignment, chunk_size, progress))
+    yield '\n]}\n'
+
+
+def iter_archive_jsonl(assignment, chunk_size=CHUNK_SIZE, progress=None):
+    """逐行产出作业 JSON Lines 存档，每行带 type 字段"""
+    yield dumps({'type': 'assignment', **assignment_data(assignment)}) + '\n'
+    for question in iter_question_data(assignment):
+        yield dumps({'type': 'question', **question}) + '\n'
+    for submission in iter_submission_data(assignment, chunk_size, progress):
+        yield dumps({'type': 'submission', **submission}) + '\n'
+
+
+# ==================== 导出格式与打包 ====================
+
+# 格式 -> (生成函数, 扩展名, Content-Type)
+EXPORT_FORMATS = {
+    'xlsx': (iter_gradebook_xlsx, 'xlsx', XLSX_CONTENT_TYPE),
+    'csv': (iter_gradebook_csv, 'csv', 'text/csv; charset=utf-8'),
+    'json': (iter_archive_json, 'json', 'application/json; charset=utf-8'),
+    'jsonl': (iter_archive_jsonl, 'jsonl', 'application/x-ndjson; charset=utf-8'),
+}
+
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def iter_export(assignment, export_format, progress=None):
+    """按格式逐块产出作业导出内容（统一为字节）"""
+    generate = EXPORT_FORMATS[export_format][0]
+    for chunk in generate(assignment, progress=progress):
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def exportable_assignments(teaching_class):
+    """教学班内有已批改提交的作业"""
+    return teaching_class.assignment_set.filter(
+        studentsubmission__is_submitted=True, studentsubmission__is_graded=True
+    ).distinct().order_by('publish_time', 'id')
+
+
+def archive_member_name(assignment, export_format):
+    """作业在压缩包中的文件名；以作业ID开头，标题相同的作业也不会重名"""
+    title = UNSAFE_FILENAME_RE.sub('_', assignment.title).strip() or '作业'
+    return f'{assignment.id}_{title}.{EXPORT_FORMATS[export_format][1]}'
+
+
+def iter_archive_members(assignments, export_format, progress=None):
+    """逐个产出 (压缩包内文件名, 内容字节块迭代器)，内容在遍历时才生成"""
+    for assignment in assignments:
+        yield archive_member_name(assignment, export_format), iter_export(assignment, export_format, progress)
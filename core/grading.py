@@ -0,0 +1,157 @@
+"""
+客观题自动判分
+
+一次读取作业的全部题目和正式提交，在内存中逐题比对客观题答案，
+题目得分用一条 INSERT ... ON CONFLICT DO UPDATE 批量写入 QuestionScore，
+提交总分用 bulk_update 批量写回。查询次数与学生人数、题目数量无关。
+
+主观题保留教师已给出的分数；客观题中教师批改时手动给出或改过的得分（is_manual）
+同样保留，不被重新判分覆盖。作业只有客观题时，提交直接标记为已批改。
+"""
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import QuestionScore, StudentSubmission
+
+BATCH_SIZE = 1000
+
+
+class AutoGradeResult:
+    """一次自动判分的结果"""
+
+    def __init__(self, submissions=0, question_scores=0, graded=0):
+        self.submissions = submissions
+        self.question_scores = question_scores
+        self.graded = graded
+
+    def __str__(self):
+        return f'判分 {self.submissions} 份提交、{self.question_scores} 道题目，其中 {self.graded} 份已完成批改'
+
+
+def auto_grade_assignment(assignment, graded_by=None):
+    """对作业的全部正式提交进行客观题判分，返回 AutoGradeResult"""
+    questions = list(assignment.questions.all())
+    objective = [question for question in questions if question.is_objective]
+    if not objective:
+        return AutoGradeResult()
+    has_subjective = len(objective) < len(questions)
+
+    # 标准答案只规整一次
+    answer_keys = [
+        (question, str(question.id), question.normalize_answer(question.correct_answer))
+        for question in objective
+    ]
+
+    submissions = list(assignment.studentsubmission_set.filter(is_submitted=True))
+    if not submissions:
+        return AutoGradeResult()
+
+    submission_ids = [submission.id for submission in submissions]
+    objective_ids = [question.id for question in objective]
+
+    # 主观题已有得分（教师批改过的部分）计入总分
+    subjective_totals = {}
+    if has_subjective:
+        subjective_totals = dict(
+            QuestionScore.objects.filter(
+                submission__in=submission_ids
+            ).exclude(
+                question__in=objective_ids
+            ).values('submission').annotate(total=Sum('score')).values_list('submission', 'total')
+        )
+
+    # 教师手动给出的客观题得分保留原值
+    manual_scores = {
+        (submission_id, question_id): score
+        for submission_id, question_id, score in QuestionScore.objects.filter(
+            submission__in=submission_ids, question__in=objective_ids, is_manual=True
+        ).values_list('submission', 'question', 'score')
+    }
+
+    now = timezone.now()
+    scores = []
+    for submission in submissions:
+        answers = submission.answers if isinstance(submission.answers, dict) else {}
+        total = subjective_totals.get(submission.id) or 0
+        for question, key, correct in answer_keys:
+            manual = manual_scores.get((submission.id, question.id))
+            if manual is not None:
+                total += manual
+                continue
+            answer = answers.get(key)
+            earned = question.score if answer not in (None, '') and question.normalize_answer(answer) == correct else 0
+            scores.append(QuestionScore(submission=submission, question=question, score=earned))
+            total += earned
+        submission.score = total
+        if not has_subjective and not submission.is_graded:
+            submission.is_graded = True
+            submission.graded_by = graded_by
+            submission.graded_at = now
+
+    with transaction.atomic():
+        QuestionScore.objects.bulk_create(
+            scores,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['submission', 'question'],
+            update_fields=['score'],
+        )
+        StudentSubmission.objects.bulk_update(
+            submissions,
+            ['score', 'is_graded', 'graded_by', 'graded_at'],
+            batch_size=BATCH_SIZE,
+        )
+
+    graded = sum(1 for submission in submissions if submission.is_graded)
+    return AutoGradeResult(len(submissions), len(scores), graded)
+
+
+def save_manual_grades(submission, entries, graded_by, teacher_comments='', initial_scores=None):
+    """
+    保存教师对一份提交的逐题批改，entries 为 [(题目, 得分, 评语), ...]。
+    先一次读出已有得分，新记录 bulk_create、有变化的记录 bulk_update，
+    与提交总分一起在同一事务中写入，语句数与题目数量无关。
+
+    initial_scores 为批改表单渲染时预填的得分 {题目 id: 得分}，缺省时按表单默认值 0 处理。
+    与预填值不同的客观题得分标记为教师评分，之后的自动判分不会覆盖；
+    原样提交的预填值（包括未判分题目的默认 0 分）仍可被重新判分。
+    """
+    initial_scores = initial_scores or {}
+    with transaction.atomic():
+        existing = {
+            question_score.question_id: question_score
+            for question_score in QuestionScore.objects.select_for_update().filter(submission=submission)
+        }
+        created, changed = [], []
+        total = 0
+        for question, score, comment in entries:
+            total += score
+            touched = score != initial_scores.get(question.id, 0)
+            question_score = existing.get(question.id)
+            if question_score is None:
+                created.append(QuestionScore(
+                    submission=submission, question=question, score=score, teacher_comment=comment,
+                    is_manual=touched or not question.is_objective
+                ))
+            elif question_score.score != score or question_score.teacher_comment != comment:
+                if touched:
+                    question_score.is_manual = True
+                question_score.score = score
+                question_score.teacher_comment = comment
+                changed.append(question_score)
+
+        if created:
+            QuestionScore.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if changed:
+            QuestionScore.objects.bulk_update(
+                changed, ['score', 'teacher_comment', 'is_manual'], batch_size=BATCH_SIZE
+            )
+
+        submission.score = total
+        submission.teacher_comments = teacher_comments
+        submission.is_graded = True
+        submission.graded_by = graded_by
+        submission.graded_at = timezone.now()
+        submission.save(update_fields=['score', 'teacher_comments', 'is_graded', 'graded_by', 'graded_at'])
+    return total
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.grading import auto_grade_assignment
+from core.models import Assignment
+
+
+class Command(BaseCommand):
+    help = '对作业的正式提交进行客观题自动判分'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'assignment_ids',
+            nargs='*',
+            type=int,
+            help='作业ID，可指定多个',
+        )
+        parser.add_argument(
+            '--all-published',
+            action='store_true',
+            help='对所有已发布和已截止的作业判分',
+        )
+
+    def handle(self, *args, **options):
+        if options['assignment_ids']:
+            assignments = Assignment.objects.filter(pk__in=options['assignment_ids'])
+        elif options['all_published']:
+            assignments = Assignment.objects.filter(status__in=['published', 'closed'])
+        else:
+            raise CommandError('请指定作业ID，或使用 --all-published')
+
+        for assignment in assignments.order_by('pk'):
+            result = auto_grade_assignment(assignment)
+            self.stdout.write(f'[{assignment.pk}] {assignment.title}：{result}')
+        self.stdout.write(self.style.SUCCESS('自动判分完成'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.view_counters import flush_view_counts, get_flush_interval
+
+
+class Command(BaseCommand):
+    help = '把缓冲中的浏览次数批量写回数据库（需配置各进程共享的缓存）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='持续运行，按 VIEW_COUNT_FLUSH_INTERVAL 间隔反复写回',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            updated = flush_view_counts()
+            total = sum(sum(deltas.values()) for deltas in updated.values())
+            objects = sum(len(deltas) for deltas in updated.values())
+            self.stdout.write(f'已写回 {objects} 个对象的 {total} 次浏览')
+            if not options['loop']:
+                break
+            time.sleep(get_flush_interval())
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = '清空并重建讨论区全文检索索引（仅支持SQLite）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批写入的记录数（默认1000）',
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('全文检索索引仅支持SQLite数据库')
+        posts, replies = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已索引 {posts} 个帖子和 {replies} 条回复'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ForumLike, ForumPost, ForumReply
+from core.ranking import rebuild_hot_scores
+
+
+class Command(BaseCommand):
+    help = '按现有的帖子、回复和点赞重新计算所有帖子的热度（调整权重或半衰期后执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批写入的帖子数（默认500）',
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_hot_scores(ForumPost, ForumReply, ForumLike, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重新计算 {total} 个帖子的热度'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import rebuild_user_counters
+
+
+class Command(BaseCommand):
+    help = '全量重建所有用户的角标计数（UserCounters）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批重新计算的用户数（默认500）',
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild_user_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {total} 个用户的计数'))
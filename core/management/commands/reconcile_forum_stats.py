@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.counters import rebuild_user_counters
+from core.models import ForumCategory, ForumPost
+
+
+class Command(BaseCommand):
+    help = '按回复和帖子记录重新计算帖子的回复统计和分类的帖子统计（用于数据导入后修复）'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = ForumPost.objects.reconcile_reply_stats()
+            categories = ForumCategory.objects.reconcile_post_stats()
+            # 批量UPDATE不触发信号，回复数变化后同步重建用户计数
+            users = rebuild_user_counters()
+        self.stdout.write(self.style.SUCCESS(f'已校正 {updated} 个帖子的回复统计、{categories} 个分类的帖子统计，重建 {users} 个用户的计数'))
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from core.export_jobs import get_poll_interval, get_worker_count, requeue_running_jobs, run_claimed_job
+from core.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = '执行排队中的后台导出任务（在 Web 进程之外运行，可多个进程同时运行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='并行执行的任务数，默认取 EXPORT_JOB_WORKERS（2）',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='持续运行，队列为空时按 EXPORT_JOB_POLL_INTERVAL 间隔轮询新任务',
+        )
+        parser.add_argument(
+            '--requeue-running',
+            action='store_true',
+            help='启动前把处于导出中的任务退回队列（仅在没有其他 worker 运行时使用）',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'] or get_worker_count(), 1)
+        if options['requeue_running']:
+            self.stdout.write(f'已退回 {requeue_running_jobs()} 个导出中的任务')
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # 有空闲线程时领取新任务
+                while len(running) < workers:
+                    job = ExportJob.claim_next()
+                    if job is None:
+                        break
+                    self.stdout.write(f'[{job.pk}] 开始导出：{job}')
+                    running.add(executor.submit(run_claimed_job, job))
+
+                if not running:
+                    if not options['loop']:
+                        break
+                    time.sleep(get_poll_interval())
+                    continue
+
+                done, running = wait(running, timeout=get_poll_interval(), return_when=FIRST_COMPLETED)
+                running = set(running)
+                for future in done:
+                    job = future.result()
+                    message = f'[{job.pk}] {job.get_status_display()}'
+                    if job.status == 'failed':
+                        self.stdout.write(self.style.ERROR(f'{message}：{job.error_message}'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'{message}：{job.output_file.name}'))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:13
+
+from django.db import migrations, models
+
+
+# 补齐模型与迁移的历史差异：Question.question_type 的选项在 0004 之后有调整但未生成迁移。
+# 与 UserCounters 无关，单独作为一个迁移。
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_studentsubmission_is_submitted'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='question_type',
+            field=models.CharField(choices=[('single_choice', '单选题'), ('multiple_choice', '多选题'), ('fill_blank', '填空题'), ('short_answer', '简答题'), ('essay', '论述题'), ('true_false', '判断题')], max_length=20, verbose_name='题目类型'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_question_question_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+                ('unread_private_messages', models.PositiveIntegerField(default=0, help_text='教师：任课教学班内尚无回复的私信帖子数', verbose_name='未读私信数量')),
+                ('unread_replies', models.PositiveIntegerField(default=0, help_text='学生：自己帖子下的未读回复总数', verbose_name='未读回复数量')),
+                ('pending_assignments', models.PositiveIntegerField(default=0, help_text='学生：所在教学班已发布但尚未提交的作业数', verbose_name='未完成作业数量')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '用户计数',
+                'verbose_name_plural': '用户计数',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_usercounters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['visibility', 'teaching_class'], name='forumpost_visibility_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['category', 'is_pinned', 'last_reply_at'], name='forumpost_category_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:14
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_forumpost_forumpost_visibility_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='forumpost',
+            options={'ordering': ['-is_pinned', '-last_reply_at', '-created_at', '-id'], 'verbose_name': '讨论帖子', 'verbose_name_plural': '讨论帖子'},
+        ),
+    ]
@@ -0,0 +1,48 @@
+import re
+
+from django.db import migrations
+
+CJK_RE = re.compile(r'([㐀-䶿一-鿿豈-﫿])')
+
+
+def segment(text):
+    return CJK_RE.sub(r' \1 ', text or '')
+
+
+def create_search_index(apps, schema_editor):
+    """创建讨论区全文检索虚拟表并写入已有的帖子和回复（仅SQLite）"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS core_forum_search '
+        'USING fts5(title, body, post_id UNINDEXED)'
+    )
+    ForumPost = apps.get_model('core', 'ForumPost')
+    ForumReply = apps.get_model('core', 'ForumReply')
+    sql = 'INSERT INTO core_forum_search (rowid, title, body, post_id) VALUES (%s, %s, %s, %s)'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [post_id * 2, segment(title), segment(content), post_id]
+            for post_id, title, content in ForumPost.objects.values_list('id', 'title', 'content')
+        ])
+        cursor.executemany(sql, [
+            [reply_id * 2 + 1, '', segment(content), post_id]
+            for reply_id, content, post_id in ForumReply.objects.values_list('id', 'content', 'post_id')
+        ])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS core_forum_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_alter_forumpost_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
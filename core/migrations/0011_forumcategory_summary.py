@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+
+
+def populate_category_stats(apps, schema_editor):
+    """按现有帖子计算各分类的帖子数量和最新帖子"""
+    ForumCategory = apps.get_model('core', 'ForumCategory')
+    ForumPost = apps.get_model('core', 'ForumPost')
+    posts = ForumPost.objects.filter(category=models.OuterRef('pk'))
+    post_count = posts.order_by().values('category').annotate(total=models.Count('pk')).values('total')
+    latest_post = posts.order_by('-created_at', '-id')
+    ForumCategory.objects.update(
+        post_count=Coalesce(models.Subquery(post_count), models.Value(0)),
+        last_post_at=models.Subquery(latest_post.values('created_at')[:1]),
+        last_post=models.Subquery(latest_post.values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_forum_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumcategory',
+            name='last_post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.forumpost', verbose_name='最新帖子'),
+        ),
+        migrations.AddField(
+            model_name='forumcategory',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最新发帖时间'),
+        ),
+        migrations.AddField(
+            model_name='forumcategory',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='帖子数量'),
+        ),
+        migrations.RunPython(populate_category_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:26
+
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 以下为迁移时 core.ranking 中热度算法的固定副本，之后修改 ranking 不影响本迁移
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+POST_WEIGHT = 10
+VIEW_WEIGHT = 1
+REPLY_WEIGHT = 5
+LIKE_WEIGHT = 3
+
+
+def event_score(weight, when):
+    bucket = (when - HOT_SCORE_EPOCH).total_seconds() // 3600
+    return math.log2(weight) + bucket / getattr(settings, 'HOT_SCORE_HALF_LIFE_HOURS', 24)
+
+
+def combine(score, other):
+    if score is None:
+        return other
+    high, low = max(score, other), min(score, other)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def populate_hot_scores(apps, schema_editor):
+    """按现有的帖子、回复和点赞计算热度"""
+    ForumPost = apps.get_model('core', 'ForumPost')
+    ForumReply = apps.get_model('core', 'ForumReply')
+    ForumLike = apps.get_model('core', 'ForumLike')
+
+    scores = {}
+    last_active = dict(ForumPost.objects.filter(
+        last_reply_at__isnull=False
+    ).values_list('id', 'last_reply_at'))
+
+    for post_id, created_at in ForumReply.objects.values_list('post_id', 'created_at').iterator():
+        scores[post_id] = combine(scores.get(post_id), event_score(REPLY_WEIGHT, created_at))
+
+    for post_id, created_at in ForumLike.objects.values_list('reply__post_id', 'created_at').iterator():
+        scores[post_id] = combine(scores.get(post_id), event_score(LIKE_WEIGHT, created_at))
+
+    posts = []
+    for post_id, created_at, view_count in ForumPost.objects.values_list(
+        'id', 'created_at', 'view_count'
+    ).iterator():
+        score = combine(scores.get(post_id), event_score(POST_WEIGHT, created_at))
+        if view_count:
+            score = combine(score, event_score(VIEW_WEIGHT * view_count, last_active.get(post_id, created_at)))
+        posts.append(ForumPost(id=post_id, hot_score=score))
+    ForumPost.objects.bulk_update(posts, ['hot_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_forumcategory_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='hot_score',
+            field=models.FloatField(default=0, help_text='按时间衰减的活动加权和（对数形式），随浏览、回复、点赞增量更新', verbose_name='热度'),
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['-hot_score', '-id'], name='forumpost_hot_idx'),
+        ),
+        migrations.RunPython(populate_hot_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_forumpost_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentsubmission',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, help_text='草稿答案每保存一次加一，用于自动保存的乐观并发控制', verbose_name='答案版本'),
+        ),
+    ]
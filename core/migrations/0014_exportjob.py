@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_studentsubmission_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_format', models.CharField(choices=[('xlsx', 'Excel (.xlsx)'), ('csv', 'CSV (.csv)'), ('json', 'JSON (.json)'), ('jsonl', 'JSON Lines (.jsonl)')], default='xlsx', max_length=10, verbose_name='导出格式')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '导出中'), ('done', '已完成'), ('failed', '失败')], default='queued', max_length=10, verbose_name='状态')),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='已写出的提交记录占全部提交记录的百分比', verbose_name='进度(%)')),
+                ('output_file', models.FileField(blank=True, upload_to='exports/%Y/%m/', verbose_name='导出文件')),
+                ('error_message', models.TextField(blank=True, verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('assignment', models.ForeignKey(blank=True, help_text='导出单个作业时填写', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.assignment', verbose_name='作业')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='创建者')),
+                ('teaching_class', models.ForeignKey(blank=True, help_text='打包导出教学班全部作业时填写', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='core.teachingclass', verbose_name='教学班')),
+            ],
+            options={
+                'verbose_name': '导出任务',
+                'verbose_name_plural': '导出任务',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='exportjob_queue_idx')],
+            },
+        ),
+    ]
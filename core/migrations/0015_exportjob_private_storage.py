@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:54
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='output_file',
+            field=models.FileField(blank=True, storage=core.storage.private_export_storage, upload_to=core.storage.export_upload_to, verbose_name='导出文件'),
+        ),
+    ]
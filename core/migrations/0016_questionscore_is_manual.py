@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_exportjob_private_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionscore',
+            name='is_manual',
+            field=models.BooleanField(default=False, help_text='得分由教师在批改时给出或修改，客观题自动判分不会覆盖', verbose_name='教师评分'),
+        ),
+    ]
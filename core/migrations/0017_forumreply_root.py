@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_reply_roots(apps, schema_editor):
+    """按现有的父回复关系为楼中楼回复填写所属的顶层回复"""
+    ForumReply = apps.get_model('core', 'ForumReply')
+    parents = dict(ForumReply.objects.values_list('id', 'parent_id').iterator())
+
+    replies = []
+    for reply_id, parent_id in parents.items():
+        if parent_id is None:
+            continue
+        root_id = parent_id
+        while parents.get(root_id) is not None:
+            root_id = parents[root_id]
+        replies.append(ForumReply(id=reply_id, root_id=root_id))
+    ForumReply.objects.bulk_update(replies, ['root'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_questionscore_is_manual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumreply',
+            name='root',
+            field=models.ForeignKey(blank=True, help_text='楼中楼回复所在的顶层回复，顶层回复为空；用于一次取出一页楼层下的全部回复', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='core.forumreply', verbose_name='所属楼层'),
+        ),
+        migrations.RunPython(populate_reply_roots, migrations.RunPython.noop),
+    ]
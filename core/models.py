@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from . import ranking
+from .storage import export_upload_to, private_export_storage
+
 class User(AbstractUser):
     """扩展用户模型"""
     USER_TYPE_CHOICES = [
@@ -29,86 +33,18 @@ class User(AbstractUser):
     
     def get_unread_private_messages_count(self):
         """获取教师未读私信数量"""
-        if self.user_type != 'teacher':
-            return 0
-        
-        # 获取该教师任课的教学班
-        teaching_classes = self.teachingclass_set.all()
-        
-        # 统计未回复的私信帖子（reply_count=0表示没有任何回复）
-        unread_count = 0
-        for teaching_class in teaching_classes:
-            unread_count += teaching_class.forumpost_set.filter(
-                visibility='teacher_only',
-                reply_count=0
-            ).count()
-        
-        return unread_count
+        from .counters import unread_private_messages_count
+        return unread_private_messages_count(self)
     
     def get_unread_replies_count(self):
         """获取学生未读回复数量"""
-        if self.user_type != 'student':
-            return 0
-        
-        try:
-            # 获取学生发布的所有帖子
-            student_posts = self.forumpost_set.all()
-            
-            unread_count = 0
-            for post in student_posts:
-                # 获取该帖子的总回复数
-                total_replies = post.reply_count
-                
-                # 获取学生已读的回复数（通过PostReadStatus记录）
-                try:
-                    read_status = PostReadStatus.objects.get(user=self, post=post)
-                    read_replies = read_status.read_replies_count
-                except PostReadStatus.DoesNotExist:
-                    read_replies = 0
-                
-                # 未读回复数 = 总回复数 - 已读回复数
-                post_unread = max(0, total_replies - read_replies)
-                unread_count += post_unread
-            
-            return unread_count
-        except Exception:
-            # 如果数据库表不存在或其他错误，返回0
-            return 0
+        from .counters import unread_replies_count
+        return unread_replies_count(self)
     
     def get_pending_assignments_count(self):
         """获取学生未完成作业数量"""
-        if self.user_type != 'student':
-            return 0
-        
-        try:
-            # 获取学生的教学班
-            student_profile = self.studentprofile
-            teaching_class = student_profile.teaching_class
-            
-            if not teaching_class:
-                return 0
-            
-            # 获取该教学班的所有已发布作业
-            published_assignments = Assignment.objects.filter(
-                teaching_class=teaching_class,
-                status='published'
-            )
-            
-            # 统计未提交的作业数量
-            pending_count = 0
-            for assignment in published_assignments:
-                # 检查学生是否已提交该作业
-                has_submitted = StudentSubmission.objects.filter(
-                    assignment=assignment,
-                    student=self
-                ).exists()
-                
-                if not has_submitted:
-                    pending_count += 1
-            
-            return pending_count
-        except Exception:
-            return 0
+        from .counters import pending_assignments_count
+        return pending_assignments_count(self)
 
 class Class(models.Model):
     """专业班级模型"""
@@ -366,9 +302,27 @@ class VideoResource(models.Model):
         return self.title
     
     def increment_view_count(self):
-        """增加观看次数"""
+        """增加观看次数（写入缓冲，按间隔批量写回数据库）"""
+        from .view_counters import record_view
+        record_view(self)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
+
+
+class ForumCategoryQuerySet(models.QuerySet):
+    """讨论区分类查询集"""
+    
+    def reconcile_post_stats(self):
+        """按帖子记录重新计算帖子数量和最新帖子（一条UPDATE），返回更新的分类数"""
+        posts = ForumPost.objects.filter(category=models.OuterRef('pk'))
+        post_count = posts.order_by().values('category').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        latest_post = posts.order_by('-created_at', '-id')
+        return self.update(
+            post_count=Coalesce(models.Subquery(post_count), models.Value(0)),
+            last_post_at=models.Subquery(latest_post.values('created_at')[:1]),
+            last_post=models.Subquery(latest_post.values('pk')[:1])
+        )
 
 
 class ForumCategory(models.Model):
@@ -405,6 +359,29 @@ class ForumCategory(models.Model):
         verbose_name='创建时间'
     )
     
+    # 以下统计字段随帖子的发布和删除增量维护，可用 reconcile_forum_stats 命令校正
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='帖子数量'
+    )
+    
+    last_post_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='最新发帖时间'
+    )
+    
+    last_post = models.ForeignKey(
+        'ForumPost',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='最新帖子'
+    )
+    
+    objects = ForumCategoryQuerySet.as_manager()
+    
     class Meta:
         verbose_name = '讨论区分类'
         verbose_name_plural = '讨论区分类'
@@ -414,6 +391,50 @@ class ForumCategory(models.Model):
         return self.name
 
 
+class ForumPostQuerySet(models.QuerySet):
+    """帖子查询集"""
+    
+    def visible_to(self, user):
+        """筛选用户可见的帖子，规则与 ForumPost.can_view 一致，在数据库中一次完成"""
+        if not user.is_authenticated:
+            return self.none()
+        
+        # 管理员可以查看所有帖子
+        if user.user_type == 'admin':
+            return self
+        
+        # 作者总是可以查看自己的帖子；完全开放的帖子所有注册用户可见
+        condition = models.Q(author=user) | models.Q(visibility='public')
+        
+        if user.user_type == 'teacher':
+            # 教学班内可见和私信帖子：仅任课教师可见
+            condition |= models.Q(
+                visibility__in=['class_only', 'teacher_only'],
+                teaching_class__created_by=user
+            )
+        elif user.user_type == 'student':
+            # 教学班内可见帖子：同教学班学生可见
+            condition |= models.Q(
+                visibility='class_only',
+                teaching_class__in=StudentProfile.objects.filter(user=user).values('teaching_class')
+            )
+        
+        return self.filter(condition)
+    
+    def reconcile_reply_stats(self):
+        """按回复记录重新计算回复数量和最后回复信息（一条UPDATE），返回更新的帖子数"""
+        replies = ForumReply.objects.filter(post=models.OuterRef('pk'))
+        reply_count = replies.order_by().values('post').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        latest_reply = replies.order_by('-created_at', '-id')
+        return self.update(
+            reply_count=Coalesce(models.Subquery(reply_count), models.Value(0)),
+            last_reply_at=models.Subquery(latest_reply.values('created_at')[:1]),
+            last_reply_by=models.Subquery(latest_reply.values('author')[:1])
+        )
+
+
 class ForumPost(models.Model):
     """讨论帖子"""
     POST_TYPE_CHOICES = [
@@ -488,6 +509,12 @@ class ForumPost(models.Model):
         verbose_name='浏览次数'
     )
     
+    hot_score = models.FloatField(
+        default=0,
+        verbose_name='热度',
+        help_text='按时间衰减的活动加权和（对数形式），随浏览、回复、点赞增量更新'
+    )
+    
     reply_count = models.PositiveIntegerField(
         default=0,
         verbose_name='回复数量'
@@ -518,18 +545,55 @@ class ForumPost(models.Model):
         verbose_name='更新时间'
     )
     
+    objects = ForumPostQuerySet.as_manager()
+    
     class Meta:
         verbose_name = '讨论帖子'
         verbose_name_plural = '讨论帖子'
-        ordering = ['-is_pinned', '-last_reply_at', '-created_at']
+        ordering = ['-is_pinned', '-last_reply_at', '-created_at', '-id']
+        indexes = [
+            models.Index(fields=['visibility', 'teaching_class'], name='forumpost_visibility_idx'),
+            models.Index(fields=['category', 'is_pinned', 'last_reply_at'], name='forumpost_category_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='forumpost_hot_idx'),
+        ]
         
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        """保存时维护分类的帖子统计（与帖子写入处于同一事务）"""
+        is_new = self.pk is None
+        update_fields = kwargs.get('update_fields')
+        old_category_id = None
+        if not is_new and (update_fields is None or 'category' in update_fields):
+            old_category_id = ForumPost.objects.filter(pk=self.pk).values_list(
+                'category_id', flat=True
+            ).first()
+        
+        if is_new:
+            self.hot_score = ranking.event_score(ranking.POST_WEIGHT)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            if is_new:
+                # 新帖子：帖子数加一并记为分类的最新帖子（单条原子UPDATE）
+                ForumCategory.objects.filter(pk=self.category_id).update(
+                    post_count=models.F('post_count') + 1,
+                    last_post_at=self.created_at,
+                    last_post=self.pk
+                )
+            elif old_category_id is not None and old_category_id != self.category_id:
+                # 帖子移动到其他分类：重新计算新旧两个分类
+                ForumCategory.objects.filter(
+                    pk__in=[old_category_id, self.category_id]
+                ).reconcile_post_stats()
+    
     def increment_view_count(self):
-        """增加浏览次数"""
+        """增加浏览次数（写入缓冲，按间隔批量写回数据库）"""
+        from .view_counters import record_view
+        record_view(self)
         self.view_count += 1
-        self.save(update_fields=['view_count'])
     
     def can_view(self, user):
         """检查用户是否可以查看此帖子"""
@@ -633,6 +697,16 @@ class ForumReply(models.Model):
         verbose_name='父回复'
     )
     
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='thread_replies',
+        verbose_name='所属楼层',
+        help_text='楼中楼回复所在的顶层回复，顶层回复为空；用于一次取出一页楼层下的全部回复'
+    )
+    
     is_best_answer = models.BooleanField(
         default=False,
         verbose_name='是否为最佳答案'
@@ -662,16 +736,21 @@ class ForumReply(models.Model):
         return f'{self.post.title} - {self.author.real_name}'
     
     def save(self, *args, **kwargs):
-        """保存时更新帖子的回复统计"""
+        """保存时更新帖子的回复统计（与插入回复处于同一事务，单条原子UPDATE）"""
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        if is_new:
-            # 更新帖子的回复数量和最后回复信息
-            self.post.reply_count = self.post.replies.count()
-            self.post.last_reply_at = self.created_at
-            self.post.last_reply_by = self.author
-            self.post.save(update_fields=['reply_count', 'last_reply_at', 'last_reply_by'])
+        if self.parent_id and self.root_id is None:
+            self.root_id = self.parent.root_id or self.parent_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            if is_new:
+                # 更新帖子的回复数量和最后回复信息
+                ForumPost.objects.filter(pk=self.post_id).update(
+                    reply_count=models.F('reply_count') + 1,
+                    last_reply_at=self.created_at,
+                    last_reply_by=self.author_id,
+                    hot_score=ranking.add_event(ranking.REPLY_WEIGHT, self.created_at)
+                )
 
 
 class ForumLike(models.Model):
@@ -700,6 +779,55 @@ class ForumLike(models.Model):
         
     def __str__(self):
         return f'{self.user.real_name} 点赞了 {self.reply}'
+    
+    @classmethod
+    def like(cls, user, reply_id):
+        """
+        点赞（幂等）：依靠 (user, reply) 唯一约束去重，不先查后插；
+        只有真正插入了记录才把回复的 like_count 加一并累加帖子热度，均在同一事务中完成。
+        返回是否新增了点赞。
+        """
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    like = cls.objects.create(user=user, reply_id=reply_id)
+            except IntegrityError:
+                return False
+            ForumReply.objects.filter(pk=reply_id).update(like_count=models.F('like_count') + 1)
+            ForumPost.objects.filter(replies=reply_id).update(
+                hot_score=ranking.add_event(ranking.LIKE_WEIGHT, like.created_at)
+            )
+        return True
+    
+    @classmethod
+    def unlike(cls, user, reply_id):
+        """
+        取消点赞（幂等）：只有真正删除了记录才把 like_count 减一，
+        并按点赞时间从帖子热度中扣除这次点赞，反复点赞/取消不会抬高热度。返回是否删除了点赞
+        """
+        with transaction.atomic():
+            likes = cls.objects.filter(user=user, reply_id=reply_id)
+            liked_at = likes.values_list('created_at', flat=True).first()
+            deleted, _ = likes.delete()
+            if not deleted:
+                return False
+            ForumReply.objects.filter(pk=reply_id, like_count__gt=0).update(
+                like_count=models.F('like_count') - 1
+            )
+            ForumPost.objects.filter(replies=reply_id).update(
+                hot_score=ranking.remove_event(ranking.LIKE_WEIGHT, liked_at)
+            )
+        return True
+    
+    @classmethod
+    def liked_reply_ids(cls, user, reply_ids):
+        """批量查询用户点赞过其中哪些回复，返回回复ID集合（一次查询）"""
+        reply_ids = list(reply_ids)
+        if not reply_ids or not user.is_authenticated:
+            return set()
+        return set(cls.objects.filter(
+            user=user, reply_id__in=reply_ids
+        ).values_list('reply_id', flat=True))
 
 
 class PostReadStatus(models.Model):
@@ -739,6 +867,19 @@ class PostReadStatus(models.Model):
         """标记为已读，更新已读回复数量为当前帖子的总回复数"""
         self.read_replies_count = self.post.reply_count
         self.save(update_fields=['read_replies_count', 'last_read_at'])
+    
+    @classmethod
+    def mark_read(cls, user, post):
+        """
+        标记帖子为已读：一条 INSERT ... ON CONFLICT DO UPDATE 完成，不先查询。
+        批量写入不发送 post_save 信号，需要时由调用方刷新用户计数。
+        """
+        cls.objects.bulk_create(
+            [cls(user=user, post=post, read_replies_count=post.reply_count)],
+            update_conflicts=True,
+            unique_fields=['user', 'post'],
+            update_fields=['read_replies_count', 'last_read_at'],
+        )
 
 
 class TeachingClass(models.Model):
@@ -859,6 +1000,66 @@ class TeachingClass(models.Model):
 
 # ==================== 作业系统模型 ====================
 
+class AssignmentQuerySet(models.QuerySet):
+    """作业查询集"""
+    
+    def with_submission_stats(self):
+        """
+        在一条查询中附加提交统计（只统计正式提交）：
+        submitted_count 提交人数、graded_submission_count 已批改、
+        pending_grading_count 待批改、late_count 逾期提交、question_count 题目数
+        """
+        submitted = models.Q(studentsubmission__is_submitted=True)
+        return self.annotate(
+            submitted_count=models.Count('studentsubmission', filter=submitted),
+            graded_submission_count=models.Count(
+                'studentsubmission', filter=submitted & models.Q(studentsubmission__is_graded=True)
+            ),
+            pending_grading_count=models.Count(
+                'studentsubmission', filter=submitted & models.Q(studentsubmission__is_graded=False)
+            ),
+            late_count=models.Count(
+                'studentsubmission', filter=submitted & models.Q(studentsubmission__is_late=True)
+            ),
+            question_count=self._question_count(),
+        )
+    
+    def with_student_submission(self, student):
+        """
+        附加学生在每份作业上的提交记录ID（student_submission_id）和题目数：
+        优先取最近一次正式提交，没有时取最近的草稿，与 Assignment.get_student_submission 一致
+        """
+        submissions = StudentSubmission.objects.filter(
+            assignment=models.OuterRef('pk'), student=student
+        ).order_by('-submit_time', '-id').values('pk')
+        return self.annotate(
+            student_submission_id=Coalesce(
+                models.Subquery(submissions.filter(is_submitted=True)[:1]),
+                models.Subquery(submissions.filter(is_submitted=False)[:1]),
+            ),
+            question_count=self._question_count(),
+        )
+    
+    def _question_count(self):
+        questions = Question.objects.filter(
+            assignment=models.OuterRef('pk')
+        ).order_by().values('assignment').annotate(total=models.Count('pk')).values('total')
+        return Coalesce(models.Subquery(questions), models.Value(0))
+    
+    def dashboard_stats(self):
+        """教师作业首页的汇总统计（一条聚合查询）"""
+        return self.aggregate(
+            total_assignments=models.Count('pk', distinct=True),
+            published_assignments=models.Count('pk', filter=models.Q(status='published'), distinct=True),
+            archived_count=models.Count('pk', filter=models.Q(status='archived'), distinct=True),
+            pending_grading=models.Count('studentsubmission', filter=models.Q(
+                status='published',
+                studentsubmission__is_submitted=True,
+                studentsubmission__is_graded=False,
+            )),
+        )
+
+
 class Assignment(models.Model):
     """作业模型"""
     STATUS_CHOICES = [
@@ -944,6 +1145,8 @@ class Assignment(models.Model):
         verbose_name='更新时间'
     )
     
+    objects = AssignmentQuerySet.as_manager()
+    
     class Meta:
         verbose_name = '作业'
         verbose_name_plural = '作业'
@@ -1100,25 +1303,30 @@ class Question(models.Model):
             return self.options
         return []
     
+    # 可以自动判分的客观题类型
+    OBJECTIVE_TYPES = ('single_choice', 'multiple_choice', 'fill_blank', 'true_false')
+    
+    @property
+    def is_objective(self):
+        return self.question_type in self.OBJECTIVE_TYPES
+    
+    def normalize_answer(self, answer):
+        """把答案规整为可直接比较的形式（仅适用于客观题）"""
+        if self.question_type == 'single_choice':
+            return str(answer).strip()
+        if self.question_type == 'multiple_choice':
+            if isinstance(answer, str):
+                answer = answer.split(',')
+            return frozenset(str(choice).strip() for choice in answer)
+        # 填空题、判断题：忽略首尾空格和大小写
+        return str(answer).strip().lower()
+    
     def is_correct_answer(self, student_answer):
         """检查学生答案是否正确（仅适用于客观题）"""
-        if self.question_type in ['single_choice', 'multiple_choice']:
-            if self.question_type == 'single_choice':
-                return str(student_answer).strip() == str(self.correct_answer).strip()
-            else:  # multiple_choice
-                if isinstance(student_answer, str):
-                    student_answer = student_answer.split(',')
-                if isinstance(self.correct_answer, str):
-                    correct_answers = self.correct_answer.split(',')
-                else:
-                    correct_answers = self.correct_answer
-                return set(map(str.strip, student_answer)) == set(map(str.strip, correct_answers))
-        elif self.question_type == 'fill_blank':
-            # 填空题简单字符串匹配
-            return str(student_answer).strip().lower() == str(self.correct_answer).strip().lower()
-        
-        # 主观题需要人工批改
-        return None
+        if not self.is_objective:
+            # 主观题需要人工批改
+            return None
+        return self.normalize_answer(student_answer) == self.normalize_answer(self.correct_answer)
 
 
 class StudentSubmission(models.Model):
@@ -1169,6 +1377,12 @@ class StudentSubmission(models.Model):
         verbose_name='是否逾期提交'
     )
     
+    revision = models.PositiveIntegerField(
+        default=0,
+        verbose_name='答案版本',
+        help_text='草稿答案每保存一次加一，用于自动保存的乐观并发控制'
+    )
+    
     teacher_comments = models.TextField(
         blank=True,
         verbose_name='教师评语',
@@ -1224,6 +1438,22 @@ class StudentSubmission(models.Model):
         if not isinstance(self.answers, dict):
             self.answers = {}
         self.answers[str(question_id)] = answer
+    
+    def merge_draft_answers(self, revision, changes):
+        """
+        把逐题的答案变更合并进草稿（乐观并发）：只有数据库中的版本仍为 revision 时才写入，
+        写入后版本加一。成功返回新版本号，版本冲突或草稿已正式提交时返回 None。
+        """
+        answers = dict(self.answers) if isinstance(self.answers, dict) else {}
+        answers.update(changes)
+        updated = StudentSubmission.objects.filter(
+            pk=self.pk, revision=revision, is_submitted=False
+        ).update(answers=answers, revision=models.F('revision') + 1)
+        if not updated:
+            return None
+        self.answers = answers
+        self.revision = revision + 1
+        return self.revision
 
 
 class QuestionScore(models.Model):
@@ -1252,6 +1482,12 @@ class QuestionScore(models.Model):
         help_text='教师对该题目的具体评价'
     )
     
+    is_manual = models.BooleanField(
+        default=False,
+        verbose_name='教师评分',
+        help_text='得分由教师在批改时给出或修改，客观题自动判分不会覆盖'
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='创建时间'
@@ -1263,4 +1499,193 @@ class QuestionScore(models.Model):
         unique_together = ['submission', 'question']
         
     def __str__(self):
-        return f"{self.submission.student.real_name} - {self.question} - {self.score}分"
\ No newline at end of file
+        return f"{self.submission.student.real_name} - {self.question} - {self.score}分"
+
+# ==================== 用户计数模型 ====================
+
+class UserCounters(models.Model):
+    """用户角标计数（写入时维护的冗余数据，供导航栏直接读取）"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='用户'
+    )
+    
+    unread_private_messages = models.PositiveIntegerField(
+        default=0,
+        verbose_name='未读私信数量',
+        help_text='教师：任课教学班内尚无回复的私信帖子数'
+    )
+    
+    unread_replies = models.PositiveIntegerField(
+        default=0,
+        verbose_name='未读回复数量',
+        help_text='学生：自己帖子下的未读回复总数'
+    )
+    
+    pending_assignments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='未完成作业数量',
+        help_text='学生：所在教学班已发布但尚未提交的作业数'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='更新时间'
+    )
+    
+    class Meta:
+        verbose_name = '用户计数'
+        verbose_name_plural = '用户计数'
+        
+    def __str__(self):
+        return f'{self.user.real_name} - 计数'
+
+
+# ==================== 导出任务模型 ====================
+
+class ExportJob(models.Model):
+    """后台导出任务：在 Web 进程之外由 run_export_jobs 命令执行，结果文件保存在 PRIVATE_EXPORT_ROOT 下的私有存储中（见 storage.py）"""
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('running', '导出中'),
+        ('done', '已完成'),
+        ('failed', '失败'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel (.xlsx)'),
+        ('csv', 'CSV (.csv)'),
+        ('json', 'JSON (.json)'),
+        ('jsonl', 'JSON Lines (.jsonl)'),
+    ]
+    
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name='创建者'
+    )
+    
+    assignment = models.ForeignKey(
+        Assignment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='export_jobs',
+        verbose_name='作业',
+        help_text='导出单个作业时填写'
+    )
+    
+    teaching_class = models.ForeignKey(
+        TeachingClass,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='export_jobs',
+        verbose_name='教学班',
+        help_text='打包导出教学班全部作业时填写'
+    )
+    
+    export_format = models.CharField(
+        max_length=10,
+        choices=FORMAT_CHOICES,
+        default='xlsx',
+        verbose_name='导出格式'
+    )
+    
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='状态'
+    )
+    
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='进度(%)',
+        help_text='已写出的提交记录占全部提交记录的百分比'
+    )
+    
+    output_file = models.FileField(
+        upload_to=export_upload_to,
+        storage=private_export_storage,
+        blank=True,
+        verbose_name='导出文件'
+    )
+    
+    error_message = models.TextField(
+        blank=True,
+        verbose_name='错误信息'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='创建时间'
+    )
+    
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='开始时间'
+    )
+    
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='完成时间'
+    )
+    
+    class Meta:
+        verbose_name = '导出任务'
+        verbose_name_plural = '导出任务'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='exportjob_queue_idx'),
+        ]
+        
+    def __str__(self):
+        return f'{self.target_name} - {self.get_export_format_display()} - {self.get_status_display()}'
+    
+    @property
+    def target_name(self):
+        if self.assignment_id:
+            return self.assignment.title
+        return self.teaching_class.name if self.teaching_class_id else ''
+    
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+    
+    @property
+    def file_extension(self):
+        """教学班导出为 zip 包，单个作业为对应格式"""
+        return 'zip' if self.teaching_class_id else self.export_format
+    
+    @property
+    def download_filename(self):
+        """下载时使用的文件名"""
+        return f'{self.target_name}_作业存档_{self.created_at.strftime("%Y%m%d_%H%M%S")}.{self.file_extension}'
+    
+    @classmethod
+    def claim_next(cls):
+        """
+        领取最早排队的一个任务并标记为导出中，没有可领取的任务时返回 None。
+        用条件 UPDATE 抢占，多个 worker 同时领取时每个任务只会被一个 worker 拿到。
+        """
+        for job_id in cls.objects.filter(status='queued').order_by('created_at', 'id').values_list('id', flat=True)[:10]:
+            claimed = cls.objects.filter(pk=job_id, status='queued').update(
+                status='running', started_at=timezone.now(), progress=0
+            )
+            if claimed:
+                return cls.objects.select_related('assignment', 'teaching_class').get(pk=job_id)
+        return None
+    
+    def set_progress(self, progress):
+        """更新进度，百分比没有变化时不写数据库"""
+        progress = max(0, min(int(progress), 100))
+        if progress != self.progress:
+            self.progress = progress
+            ExportJob.objects.filter(pk=self.pk).update(progress=progress)
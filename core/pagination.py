@@ -0,0 +1,128 @@
+"""
+游标（keyset）分页
+
+按排序字段的取值定位下一页，翻到第几页都只是一次带索引条件的 LIMIT 查询，不使用 OFFSET。
+游标令牌是经过签名的排序字段取值，同一行数据生成的令牌始终相同。
+"""
+import operator
+from functools import reduce
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+
+class KeysetPage:
+    """一页游标分页结果"""
+
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return self.cursor is None
+
+
+class KeysetPaginator:
+    """
+    游标分页器
+
+    排序字段取自查询集的 order_by（未指定时使用模型 Meta.ordering），
+    不包含主键时自动追加主键作为唯一的决胜字段。仅支持模型自身的字段。
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.model = queryset.model
+        self.ordering = self._resolve_ordering(queryset)
+
+    def _resolve_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or self.model._meta.ordering)
+        keys = []
+        for item in ordering:
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+            keys.append((field, descending))
+        if not any(field.primary_key for field, _ in keys):
+            descending = keys[-1][1] if keys else False
+            keys.append((self.model._meta.pk, descending))
+        return keys
+
+    def _order_by(self):
+        return [('-' if descending else '') + field.name for field, descending in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = []
+        for field, _ in self.ordering:
+            value = getattr(obj, field.attname)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(values, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """解析游标令牌，无效或被篡改的令牌返回 None（即从第一页开始）"""
+        if not cursor:
+            return None
+        try:
+            values = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            return None
+        return [
+            None if value is None else field.to_python(value)
+            for (field, _), value in zip(self.ordering, values)
+        ]
+
+    def _after(self, values):
+        """构造“排在游标之后”的条件：逐级比较各排序字段，NULL 的位置随数据库而定"""
+        nulls_largest = connections[self.queryset.db].features.nulls_order_largest
+        terms = []
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, values):
+            name = field.name
+            # NULL 是否排在非空值之后
+            nulls_at_end = field.null and (descending != nulls_largest)
+            if value is None:
+                after = Q(**{f'{name}__isnull': False}) if not nulls_at_end else None
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+                if nulls_at_end:
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            if after is not None:
+                terms.append(equal & after)
+            equal &= same
+        return reduce(operator.or_, terms) if terms else Q(pk__in=[])
+
+    def page(self, cursor=None):
+        values = self.decode_cursor(cursor)
+        queryset = self.queryset.order_by(*self._order_by())
+        if values is None:
+            cursor = None
+        else:
+            queryset = queryset.filter(self._after(values))
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor, cursor)
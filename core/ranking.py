@@ -0,0 +1,110 @@
+"""
+讨论区帖子热度
+
+热度是帖子各项活动（发帖、浏览、回复、点赞）按时间衰减后的加权和：
+每过 HOT_SCORE_HALF_LIFE_HOURS 小时，一次活动的贡献减半。时间按小时分桶。
+
+为了不必定期衰减全部帖子，存储的是以 2 为底的对数形式：
+
+    hot_score = log2( Σ 权重 × 2 ^ (活动所在小时数 / 半衰期) )
+
+较新的活动指数级地占优，效果等同于旧活动在衰减；任意时刻按 hot_score 排序
+都与按衰减后的热度排序一致，且新增一次活动只需一条原子 UPDATE：
+
+    new = max(old, x) + log2(1 + 2 ^ -|old - x|)，x 为这次活动的对数得分
+
+撤销一次活动（如取消点赞）按同一时间扣除：new = old + log2(1 - 2 ^ (x - old))
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+# 计算小时数的起点（固定值，修改后需执行 rebuild_hot_scores）
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# 各项活动的权重
+POST_WEIGHT = 10
+VIEW_WEIGHT = 1
+REPLY_WEIGHT = 5
+LIKE_WEIGHT = 3
+
+
+def get_half_life_hours():
+    return getattr(settings, 'HOT_SCORE_HALF_LIFE_HOURS', 24)
+
+
+def event_score(weight, when=None):
+    """一次活动的对数得分"""
+    when = when or timezone.now()
+    bucket = (when - HOT_SCORE_EPOCH).total_seconds() // 3600
+    return math.log2(weight) + bucket / get_half_life_hours()
+
+
+def combine(score, other):
+    """两个对数得分相加（log2(2^a + 2^b)），None 视为没有活动"""
+    if score is None:
+        return other
+    high, low = max(score, other), min(score, other)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def add_event(weight, when=None, field='hot_score'):
+    """在 UPDATE 中累加一次活动的表达式，例如 .update(hot_score=add_event(REPLY_WEIGHT))"""
+    score = models.Value(event_score(weight, when), output_field=models.FloatField())
+    current = models.F(field)
+    return Greatest(current, score) + Log(
+        models.Value(2.0),
+        models.Value(1.0) + Power(models.Value(2.0), -Abs(current - score)),
+    )
+
+
+def remove_event(weight, when=None, field='hot_score'):
+    """
+    在 UPDATE 中扣除一次此前计入的活动的表达式，when 须与计入时相同。
+    当前值不大于这次活动的得分时（例如热度已被重算）保持不变。
+    """
+    score = models.Value(event_score(weight, when), output_field=models.FloatField())
+    current = models.F(field)
+    # 两者极接近时 1 - 2^(x - old) 会舍入为 0，取一个下限避免对 0 取对数
+    remaining = Greatest(
+        models.Value(1.0) - Power(models.Value(2.0), score - current),
+        models.Value(2.0 ** -40),
+    )
+    return models.Case(
+        models.When(**{f'{field}__gt': score}, then=current + Log(models.Value(2.0), remaining)),
+        default=current,
+        output_field=models.FloatField(),
+    )
+
+
+def rebuild_hot_scores(post_model, reply_model, like_model, batch_size=500):
+    """
+    按现有数据重新计算全部帖子的热度，返回处理的帖子数。
+    浏览没有逐次记录，整体计在帖子最后活跃的时间。
+    （迁移 0012 中有一份固定副本，修改这里的算法不会影响该迁移。）
+    """
+    scores = {}
+    last_active = dict(post_model.objects.filter(
+        last_reply_at__isnull=False
+    ).values_list('id', 'last_reply_at'))
+
+    for post_id, created_at in reply_model.objects.values_list('post_id', 'created_at').iterator():
+        scores[post_id] = combine(scores.get(post_id), event_score(REPLY_WEIGHT, created_at))
+
+    for post_id, created_at in like_model.objects.values_list('reply__post_id', 'created_at').iterator():
+        scores[post_id] = combine(scores.get(post_id), event_score(LIKE_WEIGHT, created_at))
+
+    posts = []
+    for post_id, created_at, view_count in post_model.objects.values_list(
+        'id', 'created_at', 'view_count'
+    ).iterator():
+        score = combine(scores.get(post_id), event_score(POST_WEIGHT, created_at))
+        if view_count:
+            score = combine(score, event_score(VIEW_WEIGHT * view_count, last_active.get(post_id, created_at)))
+        posts.append(post_model(id=post_id, hot_score=score))
+    post_model.objects.bulk_update(posts, ['hot_score'], batch_size=batch_size)
+    return len(posts)
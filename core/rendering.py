@@ -0,0 +1,87 @@
+"""
+讨论区正文渲染缓存
+
+帖子和回复正文经过转义和分段（与模板的 linebreaks 过滤器一致）后缓存，
+缓存键由渲染流程版本号、对象类型、主键和修改时间组成：正文修改后 updated_at 随之改变，
+各进程和共享缓存中的旧结果都不会再被命中，无需逐个清除，过期后自然淘汰；
+调整渲染流程时提高 RENDER_PIPELINE_VERSION 即可整体失效。
+
+读取顺序为进程内 LRU → 共享缓存（RENDER_CACHE_ALIAS）→ 现场渲染，未命中时逐级回填。
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.html import linebreaks
+from django.utils.safestring import mark_safe
+
+RENDER_PIPELINE_VERSION = 1
+
+
+class LRUCache:
+    """线程安全的定长 LRU 缓存"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(getattr(settings, 'RENDER_CACHE_LRU_SIZE', 1000))
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'RENDER_CACHE_ALIAS', 'default')]
+
+
+def cache_key(obj):
+    """按 (对象类型, 主键, 修改时间) 生成缓存键"""
+    return f'forumbody:v{RENDER_PIPELINE_VERSION}:{obj._meta.label_lower}:{obj.pk}:{obj.updated_at.timestamp()}'
+
+
+def render_text(text):
+    """实际的渲染流程：转义 HTML 后按空行分段、单个换行转为 <br>"""
+    return linebreaks(text or '', autoescape=True)
+
+
+def render_body(obj):
+    """返回帖子或回复正文渲染后的 HTML（已标记为安全）；尚未保存的对象不缓存"""
+    if obj.pk is None or obj.updated_at is None:
+        return mark_safe(render_text(obj.content))
+    key = cache_key(obj)
+    html = local_cache.get(key)
+    if html is None:
+        shared = _shared_cache()
+        html = shared.get(key)
+        if html is None:
+            html = render_text(obj.content)
+            shared.set(key, html, timeout=getattr(settings, 'RENDER_CACHE_TIMEOUT', 7 * 24 * 3600))
+        local_cache.set(key, html)
+    return mark_safe(html)
@@ -0,0 +1,196 @@
+"""
+讨论区全文检索（SQLite FTS5）
+
+帖子和回复写入同一张 FTS5 虚拟表 core_forum_search：
+帖子的 rowid 为 2*id，回复的 rowid 为 2*id+1，post_id 列记录所属帖子，用于按可见性过滤。
+
+FTS5 自带的分词器不会切分中文，这里在写入和查询前把每个汉字用空格隔开，
+查询词转换为短语查询，因此任意长度的中文词（包括单字）都能按子串命中。
+非 SQLite 数据库没有该虚拟表，退化为 icontains 查询。
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import ForumPost, ForumReply
+
+SEARCH_TABLE = 'core_forum_search'
+CJK_RE = re.compile(r'([㐀-䶿一-鿿豈-﫿])')
+TOKEN_RE = re.compile(r'[^\W_]+')
+SNIPPET_RADIUS = 40
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def segment(text):
+    """在每个汉字两侧加空格，使 FTS5 把单个汉字当作一个词"""
+    return CJK_RE.sub(r' \1 ', text or '')
+
+
+def post_rowid(post_id):
+    return post_id * 2
+
+
+def reply_rowid(reply_id):
+    return reply_id * 2 + 1
+
+
+def build_match_query(query):
+    """把用户输入转换为 FTS5 MATCH 表达式：每个词一个短语，词之间为 AND"""
+    phrases = []
+    for term in query.split():
+        # 与 FTS5 unicode61 分词一致：标点和下划线都是分隔符
+        tokens = TOKEN_RE.findall(segment(term))
+        if not tokens:
+            continue
+        phrase = '"{}"'.format(' '.join(tokens))
+        # 以字母数字结尾的词按前缀匹配，例如 regress 可以命中 regression
+        if not CJK_RE.match(tokens[-1]):
+            phrase += '*'
+        phrases.append(phrase)
+    return ' AND '.join(phrases)
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, title, body, post_id) VALUES (%s, %s, %s, %s)',
+            [post_rowid(post.pk), segment(post.title), segment(post.content), post.pk]
+        )
+
+
+def index_reply(reply):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, title, body, post_id) VALUES (%s, %s, %s, %s)',
+            [reply_rowid(reply.pk), '', segment(reply.content), reply.post_id]
+        )
+
+
+def unindex(rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid])
+
+
+def rebuild_index(batch_size=1000):
+    """清空并重建索引，返回写入的帖子数和回复数"""
+    sql = f'INSERT INTO {SEARCH_TABLE} (rowid, title, body, post_id) VALUES (%s, %s, %s, %s)'
+    post_total = reply_total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        posts = ForumPost.objects.order_by().values_list('id', 'title', 'content')
+        rows = []
+        for post_id, title, content in posts.iterator(chunk_size=batch_size):
+            rows.append([post_rowid(post_id), segment(title), segment(content), post_id])
+            if len(rows) >= batch_size:
+                cursor.executemany(sql, rows)
+                post_total += len(rows)
+                rows = []
+        cursor.executemany(sql, rows)
+        post_total += len(rows)
+
+        replies = ForumReply.objects.order_by().values_list('id', 'content', 'post_id')
+        rows = []
+        for reply_id, content, post_id in replies.iterator(chunk_size=batch_size):
+            rows.append([reply_rowid(reply_id), '', segment(content), post_id])
+            if len(rows) >= batch_size:
+                cursor.executemany(sql, rows)
+                reply_total += len(rows)
+                rows = []
+        cursor.executemany(sql, rows)
+        reply_total += len(rows)
+
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return post_total, reply_total
+
+
+def highlight(text, terms):
+    """转义 HTML 后用 <mark> 标出命中的词"""
+    html = escape(text)
+    patterns = [re.escape(escape(term)) for term in terms if term]
+    if patterns:
+        html = re.sub('({})'.format('|'.join(patterns)), r'<mark>\1</mark>', html, flags=re.IGNORECASE)
+    return mark_safe(html)
+
+
+def make_snippet(text, terms):
+    """截取第一个命中词附近的片段并高亮"""
+    text = text or ''
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms if term]
+    positions = [pos for pos in positions if pos >= 0]
+    start = max(min(positions) - SNIPPET_RADIUS, 0) if positions else 0
+    end = start + SNIPPET_RADIUS * 3
+    snippet = text[start:end]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return mark_safe(prefix + highlight(snippet, terms) + suffix)
+
+
+class SearchResult:
+    """一条检索结果：命中的帖子，或命中的回复及其所属帖子"""
+
+    def __init__(self, post, reply, terms):
+        self.post = post
+        self.reply = reply
+        self.title_html = highlight(post.title, terms)
+        self.snippet_html = make_snippet(reply.content if reply else post.content, terms)
+
+
+def _search_sqlite(user, match, limit):
+    visible_sql, visible_params = ForumPost.objects.visible_to(user).order_by().values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND post_id IN ({visible_sql}) '
+            f'ORDER BY bm25({SEARCH_TABLE}, 5.0, 1.0) LIMIT %s',
+            [match, *visible_params, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(user, terms, limit):
+    posts = ForumPost.objects.visible_to(user)
+    replies = ForumReply.objects.filter(post__in=posts.values('id'))
+    for term in terms:
+        posts = posts.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        replies = replies.filter(content__icontains=term)
+    rowids = [post_rowid(pk) for pk in posts.values_list('id', flat=True)[:limit]]
+    rowids += [reply_rowid(pk) for pk in replies.order_by('-created_at').values_list('id', flat=True)[:limit]]
+    return rowids[:limit]
+
+
+def search(user, query, limit=50):
+    """检索用户可见的帖子和回复，按相关度排序，返回 SearchResult 列表"""
+    terms = query.split()
+    match = build_match_query(query)
+    if not match or not user.is_authenticated:
+        return []
+    if is_available():
+        rowids = _search_sqlite(user, match, limit)
+    else:
+        rowids = _search_fallback(user, terms, limit)
+
+    post_ids = [rowid // 2 for rowid in rowids if rowid % 2 == 0]
+    reply_ids = [rowid // 2 for rowid in rowids if rowid % 2 == 1]
+    replies = ForumReply.objects.select_related('author').in_bulk(reply_ids)
+    posts = ForumPost.objects.select_related('author', 'category').in_bulk(
+        post_ids + [reply.post_id for reply in replies.values()]
+    )
+
+    results = []
+    for rowid in rowids:
+        if rowid % 2 == 0:
+            post = posts.get(rowid // 2)
+            if post is not None:
+                results.append(SearchResult(post, None, terms))
+        else:
+            reply = replies.get(rowid // 2)
+            if reply is not None and reply.post_id in posts:
+                results.append(SearchResult(posts[reply.post_id], reply, terms))
+    return results
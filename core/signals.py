@@ -0,0 +1,177 @@
+"""
+核心应用的信号处理
+
+数据变化时刷新受影响用户的 UserCounters 计数。处理函数一般与触发写入处于同一事务中
+（回复和删除在事务提交后刷新），计数始终从源数据重新计算，重复执行也不会累积误差。
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import search
+from .counters import refresh_user_counters
+from .models import (
+    Assignment, ExportJob, ForumCategory, ForumPost, ForumReply, PostReadStatus, StudentProfile,
+    StudentSubmission, TeachingClass, User,
+)
+
+# 影响计数的字段；仅更新其他字段（如浏览次数）时跳过刷新
+FORUM_POST_COUNTER_FIELDS = {'visibility', 'reply_count', 'teaching_class', 'author'}
+ASSIGNMENT_COUNTER_FIELDS = {'status', 'teaching_class'}
+# 变化后原来的相关用户也要刷新的字段
+FORUM_POST_OWNER_FIELDS = {'teaching_class', 'author'}
+ASSIGNMENT_OWNER_FIELDS = {'teaching_class'}
+# 影响全文检索的字段
+FORUM_POST_SEARCH_FIELDS = {'title', 'content'}
+FORUM_REPLY_SEARCH_FIELDS = {'content', 'post'}
+
+
+def _touches(update_fields, relevant_fields):
+    return update_fields is None or bool(set(update_fields) & relevant_fields)
+
+
+def _post_related_user_ids(post_id):
+    """帖子作者与任课教师的用户ID"""
+    return ForumPost.objects.filter(pk=post_id).values_list(
+        'author_id', 'teaching_class__created_by_id'
+    ).first() or ()
+
+
+def _assignment_student_ids(teaching_class_id):
+    return StudentProfile.objects.filter(
+        teaching_class_id=teaching_class_id
+    ).values_list('user_id', flat=True)
+
+
+def _refresh(user_ids, signal=None):
+    """
+    刷新计数。由删除触发时，相关用户本身可能正在被级联删除，此时写入计数行会违反外键约束，
+    因此等事务提交后只刷新仍存在的用户。
+    """
+    if signal is not post_delete:
+        refresh_user_counters(user_ids)
+        return
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    transaction.on_commit(
+        lambda: refresh_user_counters(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    )
+
+
+@receiver(pre_save, sender=ForumPost)
+def remember_forum_post_owners(sender, instance, update_fields=None, **kwargs):
+    # 修改作者或教学班时，原作者和原任课教师的计数也要刷新，保存前先记下
+    instance._previous_owner_ids = ()
+    if not instance._state.adding and _touches(update_fields, FORUM_POST_OWNER_FIELDS):
+        instance._previous_owner_ids = _post_related_user_ids(instance.pk)
+
+
+@receiver(post_save, sender=ForumPost)
+@receiver(post_delete, sender=ForumPost)
+def forum_post_changed(sender, instance, update_fields=None, signal=None, **kwargs):
+    if not _touches(update_fields, FORUM_POST_COUNTER_FIELDS):
+        return
+    teacher_id = TeachingClass.objects.filter(
+        pk=instance.teaching_class_id
+    ).values_list('created_by_id', flat=True).first()
+    _refresh([instance.author_id, teacher_id, *getattr(instance, '_previous_owner_ids', ())], signal)
+
+
+@receiver(post_delete, sender=ForumPost)
+def forum_post_deleted(sender, instance, **kwargs):
+    # 发帖时在 ForumPost.save 中增量更新；删帖后最新帖子可能变化，重新计算所属分类
+    ForumCategory.objects.filter(pk=instance.category_id).reconcile_post_stats()
+
+
+@receiver(post_save, sender=ForumReply)
+@receiver(post_delete, sender=ForumReply)
+def forum_reply_changed(sender, instance, created=True, **kwargs):
+    # 帖子回复数在 ForumReply.save 发出信号之后才更新，等事务提交后再刷新
+    if created:
+        post_id = instance.post_id
+        transaction.on_commit(
+            lambda: refresh_user_counters(_post_related_user_ids(post_id))
+        )
+
+
+@receiver(post_save, sender=PostReadStatus)
+@receiver(post_delete, sender=PostReadStatus)
+def post_read_status_changed(sender, instance, signal=None, **kwargs):
+    _refresh([instance.user_id], signal)
+
+
+@receiver(pre_save, sender=Assignment)
+def remember_assignment_class(sender, instance, update_fields=None, **kwargs):
+    # 作业改到其他教学班时，原教学班学生的计数也要刷新
+    instance._previous_teaching_class_id = None
+    if not instance._state.adding and _touches(update_fields, ASSIGNMENT_OWNER_FIELDS):
+        instance._previous_teaching_class_id = Assignment.objects.filter(
+            pk=instance.pk
+        ).values_list('teaching_class_id', flat=True).first()
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def assignment_changed(sender, instance, update_fields=None, signal=None, **kwargs):
+    if not _touches(update_fields, ASSIGNMENT_COUNTER_FIELDS):
+        return
+    _refresh(list(_assignment_student_ids(instance.teaching_class_id)), signal)
+    previous_class_id = getattr(instance, '_previous_teaching_class_id', None)
+    if previous_class_id and previous_class_id != instance.teaching_class_id:
+        refresh_user_counters(_assignment_student_ids(previous_class_id))
+
+
+@receiver(post_save, sender=StudentSubmission)
+@receiver(post_delete, sender=StudentSubmission)
+def student_submission_changed(sender, instance, created=True, signal=None, **kwargs):
+    if created:
+        _refresh([instance.student_id], signal)
+
+
+@receiver(post_save, sender=StudentProfile)
+def student_profile_changed(sender, instance, **kwargs):
+    refresh_user_counters([instance.user_id])
+
+
+@receiver(post_delete, sender=StudentProfile)
+def student_profile_deleted(sender, instance, signal=None, **kwargs):
+    # 学生档案删除后不再属于任何教学班，未完成作业数随之归零
+    _refresh([instance.user_id], signal)
+
+
+@receiver(post_save, sender=TeachingClass)
+def teaching_class_changed(sender, instance, **kwargs):
+    refresh_user_counters([instance.created_by_id])
+
+
+# ==================== 全文检索索引同步 ====================
+
+@receiver(post_save, sender=ForumPost)
+def index_forum_post(sender, instance, update_fields=None, **kwargs):
+    if search.is_available() and _touches(update_fields, FORUM_POST_SEARCH_FIELDS):
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=ForumPost)
+def unindex_forum_post(sender, instance, **kwargs):
+    if search.is_available():
+        search.unindex(search.post_rowid(instance.pk))
+
+
+@receiver(post_save, sender=ForumReply)
+def index_forum_reply(sender, instance, update_fields=None, **kwargs):
+    if search.is_available() and _touches(update_fields, FORUM_REPLY_SEARCH_FIELDS):
+        search.index_reply(instance)
+
+
+@receiver(post_delete, sender=ForumReply)
+def unindex_forum_reply(sender, instance, **kwargs):
+    if search.is_available():
+        search.unindex(search.reply_rowid(instance.pk))
+
+
+# ==================== 导出文件清理 ====================
+
+@receiver(post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    if instance.output_file:
+        instance.output_file.delete(save=False)
@@ -0,0 +1,24 @@
+"""
+导出文件的私有存储
+
+导出文件包含学生成绩，不能放在 MEDIA_ROOT 下（/media/ 由 nginx 直接对外提供）。
+私有存储位于 PRIVATE_EXPORT_ROOT，Web 服务器不直接提供，只能通过需要登录的下载视图读取；
+文件名使用随机 uuid，无法根据任务编号或时间猜出。
+"""
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+
+def private_export_storage():
+    """导出文件使用的存储（FileField 的 storage 参数接受可调用对象，迁移中只记录函数路径）"""
+    return FileSystemStorage(location=settings.PRIVATE_EXPORT_ROOT)
+
+
+def export_upload_to(instance, filename):
+    """按年月分目录，文件名为随机 uuid，只保留原扩展名"""
+    extension = filename.rsplit('.', 1)[-1] if '.' in filename else ''
+    name = uuid.uuid4().hex
+    return timezone.now().strftime('%Y/%m/') + (f'{name}.{extension}' if extension else name)
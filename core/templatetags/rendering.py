@@ -0,0 +1,14 @@
+from django import template
+
+from core.rendering import render_body
+
+register = template.Library()
+
+
+@register.filter
+def rendered_body(obj):
+    """
+    讨论区帖子或回复的正文渲染（结果按对象和修改时间缓存）
+    用法：{{ post|rendered_body }}
+    """
+    return render_body(obj)
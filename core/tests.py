@@ -1,3 +1,1216 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.http import FileResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import rendering, view_counters
+from .class_exports import ARCHIVE_DIR, ArchiveCache
+from .counters import compute_user_counters, get_user_counters, refresh_user_counters
+from .exports import (
+    archive_member_name, iter_archive_json, iter_archive_jsonl, iter_gradebook_csv, iter_gradebook_xlsx,
+)
+from .grading import auto_grade_assignment, save_manual_grades
+from .models import (
+    Assignment, Class, ExportJob, ForumCategory, ForumLike, ForumPost, ForumReply, PostReadStatus,
+    Question, QuestionScore, StudentProfile, StudentSubmission, TeachingClass, User, UserCounters,
+)
+from .pagination import KeysetPaginator
+from .ranking import rebuild_hot_scores
+from .search import search as search_forum
+from .views import build_reply_thread, parse_grading_form, parse_initial_scores
+from .xlsx import cell_xml
+
+
+def create_teacher(username, real_name='王老师'):
+    return User.objects.create_user(username, password='pw', user_type='teacher', real_name=real_name)
+
+
+def create_student(username, teaching_class, student_class, number, real_name=None):
+    user = User.objects.create_user(
+        username, password='pw', user_type='student', real_name=real_name or f'学生{number}'
+    )
+    StudentProfile.objects.create(
+        user=user, gender='male', student_id=f'2024{number:07d}',
+        student_class=student_class, teaching_class=teaching_class
+    )
+    return user
+
+
+def create_assignment(teaching_class, teacher, title='作业一', status='published', total_score=20):
+    now = timezone.now()
+    return Assignment.objects.create(
+        title=title, description='说明', teaching_class=teaching_class, created_by=teacher,
+        publish_time=now - timedelta(days=1), due_time=now + timedelta(days=7),
+        status=status, total_score=total_score
+    )
+
+
+def create_questions(assignment):
+    """单选、多选、填空各 5 分，论述 5 分"""
+    return [
+        Question.objects.create(assignment=assignment, content='单选', question_type='single_choice',
+                                options=['A', 'B'], correct_answer='A', score=5, order=1),
+        Question.objects.create(assignment=assignment, content='多选', question_type='multiple_choice',
+                                options=['A', 'B', 'C'], correct_answer='A,C', score=5, order=2),
+        Question.objects.create(assignment=assignment, content='填空', question_type='fill_blank',
+                                correct_answer='Mean', score=5, order=3),
+        Question.objects.create(assignment=assignment, content='论述', question_type='essay',
+                                correct_answer='...', score=5, order=4),
+    ]
+
+
+class CourseDataMixin:
+    """一个教师、一个教学班、两名学生"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_teacher('t1')
+        cls.teaching_class = TeachingClass.objects.create(
+            name='生物统计1班', created_by=cls.teacher, start_date=date(2024, 1, 1), end_date=date(2030, 1, 1)
+        )
+        cls.student_class = Class.objects.create(name='bio_elite')
+        cls.student = create_student('s1', cls.teaching_class, cls.student_class, 1)
+        cls.other_student = create_student('s2', cls.teaching_class, cls.student_class, 2)
+        cls.category = ForumCategory.objects.create(name='综合')
+
+
+# ==================== 角标计数 ====================
+
+class UserCountersTests(CourseDataMixin, TestCase):
+
+    def assert_counters_match_source(self, *users):
+        computed = compute_user_counters([user.pk for user in users])
+        for user in users:
+            row = UserCounters.objects.get(user=user)
+            self.assertEqual(
+                (row.unread_private_messages, row.unread_replies, row.pending_assignments),
+                tuple(computed[user.pk].values()),
+                user.username,
+            )
+
+    def test_private_message_and_reply_counters(self):
+        post = ForumPost.objects.create(
+            title='私信', content='老师好', category=self.category, author=self.student,
+            visibility='teacher_only', teaching_class=self.teaching_class
+        )
+        self.assertEqual(get_user_counters(self.teacher).unread_private_messages, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ForumReply.objects.create(post=post, content='你好', author=self.teacher)
+        self.assertEqual(UserCounters.objects.get(user=self.teacher).unread_private_messages, 0)
+        self.assertEqual(UserCounters.objects.get(user=self.student).unread_replies, 1)
+
+        PostReadStatus.objects.create(user=self.student, post=post, read_replies_count=1)
+        self.assertEqual(UserCounters.objects.get(user=self.student).unread_replies, 0)
+        self.assert_counters_match_source(self.teacher, self.student)
+
+    def test_pending_assignments(self):
+        assignment = create_assignment(self.teaching_class, self.teacher)
+        self.assertEqual(UserCounters.objects.get(user=self.student).pending_assignments, 1)
+
+        StudentSubmission.objects.create(assignment=assignment, student=self.student, answers={})
+        self.assertEqual(UserCounters.objects.get(user=self.student).pending_assignments, 0)
+
+        assignment.status = 'closed'
+        assignment.save()
+        self.assertEqual(UserCounters.objects.get(user=self.other_student).pending_assignments, 0)
+        self.assert_counters_match_source(self.student, self.other_student)
+
+    def test_previous_owners_refreshed_when_post_moves(self):
+        other_teacher = create_teacher('t2', '李老师')
+        other_class = TeachingClass.objects.create(name='生物统计2班', created_by=other_teacher)
+        post = ForumPost.objects.create(
+            title='私信', content='老师好', category=self.category, author=self.student,
+            visibility='teacher_only', teaching_class=self.teaching_class
+        )
+        refresh_user_counters([self.teacher.pk, other_teacher.pk])
+
+        post.teaching_class = other_class
+        post.save()
+        self.assertEqual(UserCounters.objects.get(user=self.teacher).unread_private_messages, 0)
+        self.assertEqual(UserCounters.objects.get(user=other_teacher).unread_private_messages, 1)
+
+    def test_profile_and_user_deletion(self):
+        create_assignment(self.teaching_class, self.teacher)
+        self.assertEqual(UserCounters.objects.get(user=self.student).pending_assignments, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProfile.objects.filter(user=self.student).delete()
+        self.assertEqual(UserCounters.objects.get(user=self.student).pending_assignments, 0)
+
+        ForumPost.objects.create(title='帖子', content='内容', category=self.category, author=self.other_student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_student.delete()
+        self.assertFalse(UserCounters.objects.filter(user_id=self.other_student.pk).exists())
+
+
+# ==================== 游标分页 ====================
+
+class KeysetPaginatorTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        base = timezone.now()
+        for index in range(7):
+            post = ForumPost.objects.create(
+                title=f'帖子{index}', content='内容', category=cls.category, author=cls.student
+            )
+            # 约一半的帖子没有回复（last_reply_at 为 NULL），有回复的帖子中有两个时间相同
+            if index % 2:
+                ForumPost.objects.filter(pk=post.pk).update(
+                    last_reply_at=base - timedelta(hours=index // 3)
+                )
+
+    def collect(self, queryset, per_page=2):
+        paginator = KeysetPaginator(queryset, per_page=per_page)
+        rows, cursor, pages = [], None, 0
+        while True:
+            page = paginator.page(cursor)
+            rows.extend(page.object_list)
+            pages += 1
+            if not page.has_next:
+                return rows, pages
+            cursor = page.next_cursor
+
+    def assert_round_trip(self, *ordering):
+        queryset = ForumPost.objects.order_by(*ordering)
+        rows, pages = self.collect(queryset)
+        expected = list(queryset.order_by(*ordering, '-id' if ordering[-1].startswith('-') else 'id'))
+        self.assertEqual([post.pk for post in rows], [post.pk for post in expected])
+        self.assertEqual(pages, 4)
+
+    def test_round_trip_descending_with_nulls(self):
+        self.assert_round_trip('-last_reply_at')
+
+    def test_round_trip_ascending_with_nulls(self):
+        self.assert_round_trip('last_reply_at')
+
+    def test_round_trip_by_created_at(self):
+        self.assert_round_trip('-created_at')
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        paginator = KeysetPaginator(ForumPost.objects.order_by('-last_reply_at'), per_page=2)
+        first = paginator.page()
+        tampered = paginator.page(first.next_cursor[:-2] + 'xx')
+        self.assertTrue(tampered.is_first)
+        self.assertEqual([post.pk for post in tampered], [post.pk for post in first])
+
+    def test_same_row_gives_same_cursor(self):
+        paginator = KeysetPaginator(ForumPost.objects.order_by('-last_reply_at'), per_page=2)
+        post = ForumPost.objects.first()
+        self.assertEqual(paginator.encode_cursor(post), paginator.encode_cursor(ForumPost.objects.get(pk=post.pk)))
+
+
+# ==================== 浏览次数缓冲 ====================
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+class ViewCounterTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.posts = [
+            ForumPost.objects.create(title=f'帖子{index}', content='内容', category=cls.category, author=cls.student)
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        caches[view_counters.get_cache_alias()].clear()
+
+    def view_counts(self):
+        return dict(ForumPost.objects.filter(pk__in=[post.pk for post in self.posts]).values_list('id', 'view_count'))
+
+    def test_views_are_buffered_until_flush(self):
+        first, second, third = self.posts
+        with self.assertNumQueries(0):
+            for post in (first, first, second, second, third, third, third):
+                view_counters.record_view(post)
+        self.assertEqual(set(self.view_counts().values()), {0})
+
+        # 增量相同的帖子合并为一条 UPDATE
+        with CaptureQueriesContext(connection) as queries:
+            flushed = view_counters.flush_view_counts()
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 2)
+        self.assertEqual(flushed, {'core.forumpost': {str(first.pk): 2, str(second.pk): 2, str(third.pk): 3}})
+        self.assertEqual(self.view_counts(), {first.pk: 2, second.pk: 2, third.pk: 3})
+        self.assertGreater(ForumPost.objects.get(pk=first.pk).hot_score, first.hot_score)
+
+        # 写回后缓冲清空，新的浏览重新登记
+        self.assertEqual(view_counters.flush_view_counts(), {})
+        view_counters.record_view(first)
+        view_counters.flush_view_counts()
+        self.assertEqual(self.view_counts()[first.pk], 3)
+
+    def test_post_detail_buffers_views_without_exit_flush(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('core:forum_post_detail', args=[self.posts[0].id]))
+        self.assertEqual(self.view_counts()[self.posts[0].pk], 0)
+        # 间隔为 0 时不启动后台写回，也不登记退出时的写回
+        self.assertFalse(view_counters._exit_flush_registered)
+        view_counters.flush_view_counts()
+        self.assertEqual(self.view_counts()[self.posts[0].pk], 1)
+
+    def test_cache_settings_check(self):
+        self.assertEqual(view_counters.check_cache_settings(), [])
+        with override_settings(VIEW_COUNT_CACHE_ALIAS='default'):
+            self.assertEqual([error.id for error in view_counters.check_cache_settings()], ['core.E002'])
+        with override_settings(VIEW_COUNT_CACHE_ALIAS='missing'):
+            self.assertEqual([error.id for error in view_counters.check_cache_settings()], ['core.E001'])
+
+
+# ==================== 全文检索 ====================
+
+class ForumSearchTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_teacher = create_teacher('t2', '李老师')
+        other_class = TeachingClass.objects.create(name='生物统计2班', created_by=other_teacher)
+        cls.outsider = create_student('s3', other_class, cls.student_class, 3)
+
+        def create_post(title, content, author, visibility='public', teaching_class=None):
+            return ForumPost.objects.create(
+                title=title, content=content, category=cls.category, author=author,
+                visibility=visibility, teaching_class=teaching_class
+            )
+
+        cls.public = create_post('方差分析入门', 'logistic regression 与方差分析的区别', cls.teacher)
+        cls.class_only = create_post(
+            '班级讨论', '本班方差作业答疑', cls.teacher, 'class_only', cls.teaching_class
+        )
+        cls.private = create_post('私信', '方差题目看不懂', cls.student, 'teacher_only', cls.teaching_class)
+        cls.hidden_reply = ForumReply.objects.create(
+            post=cls.private, content='方差的定义见第三章', author=cls.teacher
+        )
+
+    def found(self, user, query):
+        return {(result.post.pk, result.reply.pk if result.reply else None) for result in search_forum(user, query)}
+
+    def test_results_follow_post_visibility(self):
+        self.assertEqual(self.found(self.outsider, '方差'), {(self.public.pk, None)})
+        self.assertEqual(self.found(self.other_student, '方差'), {(self.public.pk, None), (self.class_only.pk, None)})
+        self.assertEqual(self.found(self.student, '方差'), {
+            (self.public.pk, None), (self.class_only.pk, None), (self.private.pk, None),
+            (self.private.pk, self.hidden_reply.pk),
+        })
+        self.assertEqual(self.found(self.teacher, '第三章'), {(self.private.pk, self.hidden_reply.pk)})
+
+    def test_cjk_substrings_and_prefixes(self):
+        self.assertEqual(self.found(self.outsider, '差'), {(self.public.pk, None)})
+        self.assertEqual(self.found(self.outsider, 'regress 入门'), {(self.public.pk, None)})
+        self.assertEqual(self.found(self.outsider, '方差 不存在'), set())
+        self.assertEqual(self.found(self.outsider, '"*'), set())
+
+    def test_index_follows_edits_and_deletes(self):
+        self.public.content = '协方差矩阵'
+        self.public.save()
+        self.assertEqual(self.found(self.outsider, '矩阵'), {(self.public.pk, None)})
+        self.public.delete()
+        self.assertEqual(self.found(self.outsider, '矩阵'), set())
+
+    def test_search_view_escapes_and_highlights(self):
+        ForumPost.objects.create(title='<b>方差</b>', content='内容', category=self.category, author=self.teacher)
+        self.client.force_login(self.outsider)
+        response = self.client.get(reverse('core:forum_search'), {'q': '方差'})
+        self.assertContains(response, '&lt;b&gt;<mark>方差</mark>&lt;/b&gt;', html=False)
+        self.assertNotContains(response, '班级讨论')
+
+
+# ==================== 回复楼层 ====================
+
+class ReplyThreadTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(title='楼层', content='内容', category=cls.category, author=cls.student)
+
+    def create_chain(self, depth):
+        """一条顶层回复及其下 depth 层楼中楼回复"""
+        reply = ForumReply.objects.create(post=self.post, content='楼层', author=self.teacher)
+        top = reply
+        for level in range(depth):
+            reply = ForumReply.objects.create(post=self.post, content=f'第{level}层', author=self.student, parent=reply)
+        return top, reply
+
+    def test_query_count_does_not_grow_with_depth(self):
+        for depth in (1, 10, 30):
+            with self.subTest(depth=depth):
+                ForumReply.objects.all().delete()
+                top, leaf = self.create_chain(depth)
+                self.assertEqual(leaf.root_id, top.pk)
+                # 顶层分页、楼中楼回复、点赞状态各一次
+                with self.assertNumQueries(3):
+                    page, thread = build_reply_thread(self.post, self.student)
+                self.assertEqual(len(thread), depth + 1)
+                self.assertEqual([reply.depth for reply in thread], list(range(depth + 1)))
+
+    def test_only_current_page_subtrees_are_loaded(self):
+        tops = [self.create_chain(2)[0] for _ in range(3)]
+        page, thread = build_reply_thread(self.post, self.student, per_page=2)
+        self.assertEqual([reply.pk for reply in page.object_list], [top.pk for top in tops[:2]])
+        self.assertEqual({reply.root_id or reply.pk for reply in thread}, {top.pk for top in tops[:2]})
+        self.assertEqual(len(thread), 6)
+
+
+# ==================== 点赞 ====================
+
+class ForumLikeTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(title='帖子', content='内容', category=cls.category, author=cls.student)
+        cls.reply = ForumReply.objects.create(post=cls.post, content='回复', author=cls.teacher)
+
+    def like_count(self):
+        return ForumReply.objects.get(pk=self.reply.pk).like_count
+
+    def test_like_and_unlike_are_idempotent(self):
+        self.assertTrue(ForumLike.like(self.student, self.reply.pk))
+        self.assertFalse(ForumLike.like(self.student, self.reply.pk))
+        self.assertTrue(ForumLike.like(self.other_student, self.reply.pk))
+        self.assertEqual(self.like_count(), 2)
+
+        self.assertTrue(ForumLike.unlike(self.student, self.reply.pk))
+        self.assertFalse(ForumLike.unlike(self.student, self.reply.pk))
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(ForumLike.liked_reply_ids(self.other_student, [self.reply.pk]), {self.reply.pk})
+
+    def test_endpoint(self):
+        url = reverse('core:forum_like_reply', args=[self.reply.id])
+        self.client.force_login(self.student)
+        for _ in range(2):
+            response = self.client.post(url, {'action': 'like'})
+            self.assertEqual(response.json(), {'success': True, 'liked': True, 'like_count': 1})
+        # 省略 action 时切换当前状态
+        self.assertEqual(self.client.post(url).json(), {'success': True, 'liked': False, 'like_count': 0})
+        self.assertEqual(self.client.post(url, {'action': 'unlike'}).json()['like_count'], 0)
+
+    def test_endpoint_checks_visibility(self):
+        other_teacher = create_teacher('t2', '李老师')
+        private = ForumPost.objects.create(
+            title='私信', content='内容', category=self.category, author=self.student,
+            visibility='teacher_only', teaching_class=self.teaching_class
+        )
+        reply = ForumReply.objects.create(post=private, content='回复', author=self.teacher)
+        self.client.force_login(other_teacher)
+        response = self.client.post(reverse('core:forum_like_reply', args=[reply.id]), {'action': 'like'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ForumLike.objects.exists())
+
+
+# ==================== 正文渲染缓存 ====================
+
+class RenderCacheTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(
+            title='帖子', content='<script>x</script>\n第二行\n\n第二段', category=cls.category, author=cls.student
+        )
+
+    def setUp(self):
+        rendering.local_cache.clear()
+        caches[getattr(settings, 'RENDER_CACHE_ALIAS', 'default')].clear()
+
+    def test_matches_linebreaks_filter(self):
+        self.assertEqual(
+            rendering.render_body(self.post),
+            '<p>&lt;script&gt;x&lt;/script&gt;<br>第二行</p>\n\n<p>第二段</p>'
+        )
+
+    def test_cached_until_edited(self):
+        first = rendering.render_body(self.post)
+        self.assertEqual(rendering.local_cache.get(rendering.cache_key(self.post)), first)
+        # 共享缓存命中后回填进程内缓存
+        rendering.local_cache.clear()
+        self.assertEqual(rendering.render_body(self.post), first)
+        self.assertEqual(len(rendering.local_cache), 1)
+
+        post = ForumPost.objects.get(pk=self.post.pk)
+        post.content = '已修改'
+        post.save()
+        self.assertNotEqual(rendering.cache_key(post), rendering.cache_key(self.post))
+        self.assertEqual(rendering.render_body(post), '<p>已修改</p>')
+
+    def test_lru_evicts_oldest(self):
+        lru = rendering.LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_post_detail_uses_filter(self):
+        self.client.force_login(self.student)
+        with override_settings(VIEW_COUNT_FLUSH_INTERVAL=0):
+            response = self.client.get(reverse('core:forum_post_detail', args=[self.post.id]))
+        self.assertContains(response, '&lt;script&gt;x&lt;/script&gt;<br>第二行', html=False)
+        self.assertIsNotNone(rendering.local_cache.get(rendering.cache_key(self.post)))
+
+
+# ==================== 帖子详情条件请求 ====================
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+class PostDetailETagTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(
+            title='方差分析', content='请教', category=cls.category, author=cls.student,
+            teaching_class=cls.teaching_class
+        )
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.url = reverse('core:forum_post_detail', args=[self.post.id])
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, **headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_new_and_edited_replies_change_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = ForumReply.objects.create(post=self.post, content='回复', author=self.teacher)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        ForumReply.objects.filter(pk=reply.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_etag_depends_on_user_and_csrf_token(self):
+        etag = self.get()['ETag']
+        self.client.force_login(self.other_student)
+        self.assertEqual(self.get(etag).status_code, 200)
+
+        self.client.force_login(self.student)
+        etag = self.get()['ETag']
+        self.client.cookies.pop('csrftoken', None)
+        self.assertEqual(self.get(etag).status_code, 200)
+
+
+# ==================== 阅读状态 ====================
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+class PostReadStatusTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(title='提问', content='内容', category=cls.category, author=cls.student)
+
+    def reply(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ForumReply.objects.create(post=self.post, content='回复', author=self.teacher)
+
+    def view(self):
+        self.client.get(reverse('core:forum_post_detail', args=[self.post.id]))
+
+    def test_mark_read_upserts_one_row(self):
+        self.reply()
+        post = ForumPost.objects.get(pk=self.post.pk)
+        with self.assertNumQueries(1):
+            PostReadStatus.mark_read(self.student, post)
+        self.reply()
+        PostReadStatus.mark_read(self.student, ForumPost.objects.get(pk=self.post.pk))
+        self.assertEqual(
+            list(PostReadStatus.objects.filter(user=self.student).values_list('post', 'read_replies_count')),
+            [(self.post.pk, 2)]
+        )
+
+    def test_viewing_own_post_clears_unread_replies(self):
+        self.reply()
+        self.assertEqual(UserCounters.objects.get(user=self.student).unread_replies, 1)
+        self.client.force_login(self.student)
+        self.view()
+        self.assertEqual(PostReadStatus.objects.get(user=self.student, post=self.post).read_replies_count, 1)
+        self.assertEqual(UserCounters.objects.get(user=self.student).unread_replies, 0)
+
+    def test_repeat_view_does_not_write(self):
+        self.reply()
+        self.client.force_login(self.student)
+        self.view()
+        read_at = PostReadStatus.objects.get(user=self.student, post=self.post).last_read_at
+        self.view()
+        self.assertEqual(PostReadStatus.objects.get(user=self.student, post=self.post).last_read_at, read_at)
+
+    def test_other_users_are_not_tracked(self):
+        self.client.force_login(self.other_student)
+        self.view()
+        self.assertFalse(PostReadStatus.objects.exists())
+
+
+# ==================== 分类统计 ====================
+
+class ForumCategoryStatsTests(CourseDataMixin, TestCase):
+
+    def create_post(self, category, title):
+        return ForumPost.objects.create(title=title, content='内容', category=category, author=self.student)
+
+    def test_incremental_stats_match_reconcile(self):
+        other = ForumCategory.objects.create(name='问答')
+        first = self.create_post(self.category, '第一帖')
+        second = self.create_post(self.category, '第二帖')
+        self.category.refresh_from_db()
+        self.assertEqual((self.category.post_count, self.category.last_post_id), (2, second.pk))
+
+        # 移动分类：新旧分类都重新计算
+        second.category = other
+        second.save()
+        self.category.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.category.post_count, self.category.last_post_id), (1, first.pk))
+        self.assertEqual((other.post_count, other.last_post_id), (1, second.pk))
+
+        # 删除最新帖子后回退到上一篇
+        self.create_post(other, '第三帖').delete()
+        other.refresh_from_db()
+        self.assertEqual((other.post_count, other.last_post_id), (1, second.pk))
+
+    def test_reconcile_repairs_drift(self):
+        post = self.create_post(self.category, '帖子')
+        ForumCategory.objects.update(post_count=99, last_post=None, last_post_at=None)
+        self.assertEqual(ForumCategory.objects.reconcile_post_stats(), 1)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.post_count, 1)
+        self.assertEqual(self.category.last_post_id, post.pk)
+        self.assertEqual(self.category.last_post_at, post.created_at)
+
+
+# ==================== 帖子热度 ====================
+
+class HotScoreTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.post = ForumPost.objects.create(title='热帖', content='内容', category=cls.category, author=cls.student)
+        cls.reply = ForumReply.objects.create(post=cls.post, content='回复', author=cls.teacher)
+
+    def hot_score(self):
+        return ForumPost.objects.get(pk=self.post.pk).hot_score
+
+    def test_like_and_reply_raise_score(self):
+        before = self.hot_score()
+        ForumLike.like(self.other_student, self.reply.pk)
+        self.assertGreater(self.hot_score(), before)
+
+    def test_unlike_takes_the_like_back_off(self):
+        before = self.hot_score()
+        for _ in range(50):
+            ForumLike.like(self.other_student, self.reply.pk)
+            ForumLike.unlike(self.other_student, self.reply.pk)
+        self.assertAlmostEqual(self.hot_score(), before, places=9)
+        self.assertEqual(ForumReply.objects.get(pk=self.reply.pk).like_count, 0)
+
+    def test_score_matches_rebuild(self):
+        ForumLike.like(self.student, self.reply.pk)
+        ForumLike.like(self.other_student, self.reply.pk)
+        ForumLike.unlike(self.student, self.reply.pk)
+        incremental = self.hot_score()
+        rebuild_hot_scores(ForumPost, ForumReply, ForumLike)
+        self.assertAlmostEqual(self.hot_score(), incremental, places=9)
+
+
+# ==================== 教师作业首页 ====================
+
+class TeacherDashboardTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assignment = create_assignment(cls.teaching_class, cls.teacher)
+        create_questions(cls.assignment)
+        StudentSubmission.objects.create(assignment=cls.assignment, student=cls.student, is_submitted=True, answers={})
+        StudentSubmission.objects.create(
+            assignment=cls.assignment, student=cls.other_student, is_submitted=True, is_graded=True, answers={}
+        )
+        # 草稿不计入统计
+        StudentSubmission.objects.create(
+            assignment=cls.assignment, student=cls.other_student, is_submitted=False, answers={}
+        )
+        create_assignment(cls.teaching_class, cls.teacher, title='已归档', status='archived')
+
+    def test_submission_stats(self):
+        assignment = Assignment.objects.with_submission_stats().get(pk=self.assignment.pk)
+        self.assertEqual(
+            (assignment.submitted_count, assignment.graded_submission_count, assignment.pending_grading_count,
+             assignment.late_count, assignment.question_count),
+            (2, 1, 1, 0, 4)
+        )
+        self.assertEqual(Assignment.objects.filter(created_by=self.teacher).dashboard_stats(), {
+            'total_assignments': 2, 'published_assignments': 1, 'archived_count': 1, 'pending_grading': 1,
+        })
+
+    def test_query_count_does_not_grow_with_assignments(self):
+        self.client.force_login(self.teacher)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('core:assignment_index'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        before = count_queries()
+        for index in range(3):
+            assignment = create_assignment(self.teaching_class, self.teacher, title=f'作业{index + 2}')
+            StudentSubmission.objects.create(assignment=assignment, student=self.student, is_submitted=True, answers={})
+        self.assertEqual(count_queries(), before)
+
+
+# ==================== 学生作业列表 ====================
+
+class StudentAssignmentListTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.submitted = create_assignment(cls.teaching_class, cls.teacher, title='已提交')
+        cls.drafted = create_assignment(cls.teaching_class, cls.teacher, title='草稿')
+        cls.untouched = create_assignment(cls.teaching_class, cls.teacher, title='未开始')
+        create_questions(cls.submitted)
+        # 正式提交之后又保存了新草稿：仍以正式提交为准
+        cls.submission = StudentSubmission.objects.create(
+            assignment=cls.submitted, student=cls.student, is_submitted=True, answers={}
+        )
+        StudentSubmission.objects.create(assignment=cls.submitted, student=cls.student, is_submitted=False, answers={})
+        cls.draft = StudentSubmission.objects.create(
+            assignment=cls.drafted, student=cls.student, is_submitted=False, answers={}
+        )
+        StudentSubmission.objects.create(
+            assignment=cls.drafted, student=cls.other_student, is_submitted=True, answers={}
+        )
+
+    def test_resolves_latest_submission_then_draft(self):
+        assignments = Assignment.objects.with_student_submission(self.student).in_bulk()
+        self.assertEqual(assignments[self.submitted.pk].student_submission_id, self.submission.pk)
+        self.assertEqual(assignments[self.drafted.pk].student_submission_id, self.draft.pk)
+        self.assertIsNone(assignments[self.untouched.pk].student_submission_id)
+        self.assertEqual(assignments[self.submitted.pk].question_count, 4)
+        for assignment in (self.submitted, self.drafted, self.untouched):
+            submission = assignment.get_student_submission(self.student)
+            self.assertEqual(assignments[assignment.pk].student_submission_id, submission and submission.pk)
+
+    def test_list_buckets_and_query_count(self):
+        self.client.force_login(self.student)
+
+        def get():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('core:assignment_index'))
+            return response, len(queries)
+
+        response, before = get()
+        self.assertEqual(response.context['stats'], {'total': 3, 'pending': 1, 'draft': 1, 'completed': 1, 'overdue': 0})
+        self.assertEqual(response.context['completed_assignments'][0]['submission'], self.submission)
+
+        for index in range(3):
+            assignment = create_assignment(self.teaching_class, self.teacher, title=f'作业{index}')
+            StudentSubmission.objects.create(assignment=assignment, student=self.student, is_submitted=False, answers={})
+        response, after = get()
+        self.assertEqual(response.context['stats']['draft'], 4)
+        self.assertEqual(after, before)
+
+
+# ==================== 判分 ====================
+
+class GradingDataMixin(CourseDataMixin):
+    """一份作业（四道题）、一份全对和一份全错的正式提交"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assignment = create_assignment(cls.teaching_class, cls.teacher)
+        cls.questions = create_questions(cls.assignment)
+        single, multiple, blank, essay = cls.questions
+        cls.submission = StudentSubmission.objects.create(
+            assignment=cls.assignment, student=cls.student, is_submitted=True,
+            answers={str(single.id): 'A', str(multiple.id): 'C, A', str(blank.id): ' mean ', str(essay.id): '略'},
+        )
+        cls.wrong = StudentSubmission.objects.create(
+            assignment=cls.assignment, student=cls.other_student, is_submitted=True,
+            answers={str(single.id): 'B', str(multiple.id): 'A'},
+        )
+
+    def scores(self, submission):
+        return dict(QuestionScore.objects.filter(submission=submission).values_list('question_id', 'score'))
+
+    def manual_questions(self, submission):
+        return set(QuestionScore.objects.filter(
+            submission=submission, is_manual=True
+        ).values_list('question_id', flat=True))
+
+
+class AutoGradeTests(GradingDataMixin, TestCase):
+
+    def test_auto_grade_objective_questions(self):
+        single, multiple, blank, essay = self.questions
+        result = auto_grade_assignment(self.assignment, graded_by=self.teacher)
+        self.assertEqual((result.submissions, result.question_scores, result.graded), (2, 6, 0))
+        self.assertEqual(self.scores(self.submission), {single.id: 5, multiple.id: 5, blank.id: 5})
+        self.assertEqual(self.scores(self.wrong), {single.id: 0, multiple.id: 0, blank.id: 0})
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.score, 15)
+        # 还有主观题，不标记为已批改
+        self.assertFalse(self.submission.is_graded)
+
+    def test_manual_grade_then_auto_grade_keeps_teacher_scores(self):
+        single, multiple, blank, essay = self.questions
+        auto_grade_assignment(self.assignment, graded_by=self.teacher)
+        initial_scores = {single.id: 5, multiple.id: 5, blank.id: 5, essay.id: 0}
+        entries = parse_grading_form({
+            f'question_{single.id}_score': '5',
+            f'question_{multiple.id}_score': '2.5',  # 教师改判
+            f'question_{blank.id}_score': '5',
+            f'question_{essay.id}_score': '4',
+            f'question_{essay.id}_comment': ' 不错 ',
+        }, self.questions)
+        save_manual_grades(self.submission, entries, self.teacher, teacher_comments='好', initial_scores=initial_scores)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.score, 16.5)
+        self.assertTrue(self.submission.is_graded)
+        self.assertEqual(self.manual_questions(self.submission), {multiple.id, essay.id})
+
+        auto_grade_assignment(self.assignment, graded_by=self.teacher)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.scores(self.submission)[multiple.id], 2.5)
+        self.assertEqual(self.submission.score, 16.5)
+
+    def test_manual_save_first_then_auto_grade(self):
+        single, multiple, blank, essay = self.questions
+        # 先批改论述题：客观题保留表单预填的 0 分原样提交
+        form = {f'question_{question.id}_initial': '0' for question in self.questions}
+        form.update({f'question_{question.id}_score': '0' for question in self.questions})
+        form[f'question_{essay.id}_score'] = '4'
+        save_manual_grades(
+            self.submission, parse_grading_form(form, self.questions), self.teacher,
+            initial_scores=parse_initial_scores(form, self.questions)
+        )
+        self.assertEqual(self.manual_questions(self.submission), {essay.id})
+
+        auto_grade_assignment(self.assignment, graded_by=self.teacher)
+        self.submission.refresh_from_db()
+        self.assertEqual(self.scores(self.submission), {single.id: 5, multiple.id: 5, blank.id: 5, essay.id: 4})
+        self.assertEqual(self.submission.score, 19)
+
+    def test_query_count_does_not_grow_with_submissions(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                auto_grade_assignment(self.assignment, graded_by=self.teacher)
+            return len(queries)
+
+        before = count_queries()
+        for number in range(3, 8):
+            student = create_student(f's{number}', self.teaching_class, self.student_class, number)
+            StudentSubmission.objects.create(assignment=self.assignment, student=student, is_submitted=True, answers={})
+        self.assertEqual(count_queries(), before)
+
+
+# ==================== 批量保存批改 ====================
+
+class ManualGradingTests(GradingDataMixin, TestCase):
+
+    def test_parse_grading_form_rejects_invalid_scores(self):
+        question = self.questions[0]
+        for value in ('abc', 'nan', 'inf', '-Infinity'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_grading_form({f'question_{question.id}_score': value}, [question])
+        self.assertEqual(parse_grading_form({}, [question]), [(question, 0.0, '')])
+
+    def test_save_writes_scores_and_total(self):
+        single, multiple, blank, essay = self.questions
+        entries = [(single, 5, ''), (multiple, 3, '少选'), (blank, 0, ''), (essay, 4, '论证充分')]
+        self.assertEqual(save_manual_grades(self.submission, entries, self.teacher, teacher_comments='好'), 12)
+        self.submission.refresh_from_db()
+        self.assertEqual((self.submission.score, self.submission.teacher_comments), (12, '好'))
+        self.assertTrue(self.submission.is_graded)
+        self.assertEqual(self.submission.graded_by, self.teacher)
+        self.assertEqual(
+            dict(QuestionScore.objects.filter(submission=self.submission).values_list('question_id', 'teacher_comment')),
+            {single.id: '', multiple.id: '少选', blank.id: '', essay.id: '论证充分'},
+        )
+
+        # 再次保存只改一题：总分随之更新
+        entries[1] = (multiple, 5, '')
+        self.assertEqual(save_manual_grades(self.submission, entries, self.teacher), 14)
+        self.assertEqual(self.scores(self.submission)[multiple.id], 5)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        def count_queries(submission, questions, score):
+            with CaptureQueriesContext(connection) as queries:
+                save_manual_grades(submission, [(question, score, '') for question in questions], self.teacher)
+            return len(queries)
+
+        extra = [
+            Question.objects.create(assignment=self.assignment, content=f'论述{index}', question_type='essay',
+                                    correct_answer='...', score=5, order=index)
+            for index in range(5, 9)
+        ]
+        # 首次保存全部新建，再次保存全部更新
+        for score in (1, 2):
+            self.assertEqual(
+                count_queries(self.submission, self.questions, score),
+                count_queries(self.wrong, self.questions + extra, score),
+            )
+
+
+# ==================== 草稿自动保存 ====================
+
+class AutosaveTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assignment = create_assignment(cls.teaching_class, cls.teacher)
+        cls.questions = create_questions(cls.assignment)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        self.url = reverse('core:assignment_autosave', args=[self.assignment.id])
+
+    def autosave(self, revision, answers):
+        return self.client.post(
+            self.url, json.dumps({'revision': revision, 'answers': answers}), content_type='application/json'
+        )
+
+    def test_revision_conflict(self):
+        single, multiple = self.questions[:2]
+        response = self.autosave(0, {str(single.id): 'A'})
+        self.assertEqual(response.json(), {'success': True, 'revision': 1})
+        response = self.autosave(1, {str(multiple.id): ['A', 'C']})
+        self.assertEqual(response.json(), {'success': True, 'revision': 2})
+
+        # 另一个页面仍持有版本 1：返回 409 和最新草稿，不覆盖
+        response = self.autosave(1, {str(single.id): 'B'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['revision'], 2)
+        self.assertEqual(response.json()['answers'], {str(single.id): 'A', str(multiple.id): 'A,C'})
+
+        # 以最新版本重新提交后合并写入
+        response = self.autosave(2, {str(single.id): 'B'})
+        self.assertEqual(response.json(), {'success': True, 'revision': 3})
+        draft = StudentSubmission.objects.get(assignment=self.assignment, student=self.student)
+        self.assertEqual(draft.answers, {str(single.id): 'B', str(multiple.id): 'A,C'})
+
+    def test_full_form_save_bumps_revision(self):
+        single = self.questions[0]
+        self.autosave(0, {str(single.id): 'A'})
+        self.client.post(
+            reverse('core:assignment_take', args=[self.assignment.id]),
+            {'action': 'save_draft', f'answer_{single.id}': 'B'}
+        )
+        draft = StudentSubmission.objects.get(assignment=self.assignment, student=self.student)
+        self.assertEqual((draft.revision, draft.answers[str(single.id)]), (2, 'B'))
+        # 持有旧版本的自动保存会冲突
+        self.assertEqual(self.autosave(1, {str(single.id): 'A'}).status_code, 409)
+
+    def test_rejects_foreign_questions(self):
+        other = create_assignment(self.teaching_class, self.teacher, title='作业二')
+        foreign = create_questions(other)[0]
+        self.assertEqual(self.autosave(0, {str(foreign.id): 'A'}).status_code, 400)
+
+
+# ==================== 导出 ====================
+
+class ExportDataMixin(CourseDataMixin):
+    """七名学生的正式提交，其中五份已批改；姓名含需要转义的字符"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assignment = create_assignment(cls.teaching_class, cls.teacher, title='作业/期中')
+        cls.questions = create_questions(cls.assignment)
+        students = [cls.student, cls.other_student] + [
+            create_student(f's{number}', cls.teaching_class, cls.student_class, number, real_name=f'学<&>{number}')
+            for number in range(3, 8)
+        ]
+        single, multiple, blank, essay = cls.questions
+        for index, student in enumerate(students):
+            StudentSubmission.objects.create(
+                assignment=cls.assignment, student=student, is_submitted=True,
+                answers={str(single.id): 'A' if index % 2 else 'B', str(multiple.id): 'A,C'},
+            )
+        auto_grade_assignment(cls.assignment, graded_by=cls.teacher)
+        for submission in StudentSubmission.objects.filter(assignment=cls.assignment)[:5]:
+            save_manual_grades(
+                submission, [(question, 3, '评语\n第二行') for question in cls.questions], cls.teacher,
+                teacher_comments=f'总评 "{submission.pk}"'
+            )
+
+    def baseline_rows(self):
+        """与流式导出之前的 CSV 导出相同的字段"""
+        rows = []
+        submissions = self.assignment.studentsubmission_set.filter(
+            is_submitted=True, is_graded=True
+        ).select_related('student__studentprofile', 'graded_by').order_by('id')
+        for index, submission in enumerate(submissions, 1):
+            rows.append([
+                str(index), submission.student.studentprofile.student_id, submission.student.real_name,
+                str(self.assignment.total_score), str(submission.score or 0), str(submission.score_percentage or 0),
+                submission.submit_time.strftime('%Y-%m-%d %H:%M'),
+                submission.graded_at.strftime('%Y-%m-%d %H:%M') if submission.graded_at else '',
+                submission.graded_by.real_name if submission.graded_by else '',
+                '是' if submission.is_late else '否', submission.teacher_comments or '',
+            ])
+        return rows
+
+
+class CsvExportTests(ExportDataMixin, TestCase):
+
+    def test_csv_matches_baseline(self):
+        text = ''.join(iter_gradebook_csv(self.assignment, chunk_size=2))
+        self.assertTrue(text.startswith('\ufeff'))
+        rows = list(csv.reader(io.StringIO(text[1:])))
+        self.assertEqual(rows[0], [f'作业：{self.assignment.title}'])
+        self.assertEqual(rows[1], [f'教学班：{self.teaching_class.name}'])
+        self.assertEqual(rows[4][:11], [
+            '序号', '学号', '姓名', '总分', '得分', '得分率(%)',
+            '提交时间', '批改时间', '批改教师', '是否逾期', '教师评语',
+        ])
+        self.assertEqual(rows[4][11:], ['第1题(5分)', '第2题(5分)', '第3题(5分)', '第4题(5分)'])
+        body = rows[5:]
+        self.assertEqual([row[:11] for row in body], self.baseline_rows())
+        self.assertEqual(body[0][11:], ['3.0'] * 4)
+
+    def test_export_views_stream(self):
+        self.client.force_login(self.teacher)
+        for name in ('assignment_export_csv', 'assignment_export_json', 'assignment_export_excel'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(f'core:{name}', args=[self.assignment.id]))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                self.assertTrue(response['Content-Disposition'].startswith("attachment; filename*=utf-8''"))
+                self.assertTrue(b''.join(response.streaming_content))
+
+
+class JsonExportTests(ExportDataMixin, TestCase):
+
+    def test_json_matches_baseline(self):
+        data = json.loads(''.join(iter_archive_json(self.assignment, chunk_size=2)))
+        self.assertEqual(data['assignment']['title'], self.assignment.title)
+        self.assertEqual([question['id'] for question in data['questions']], [q.id for q in self.questions])
+        submissions = self.assignment.studentsubmission_set.filter(
+            is_submitted=True, is_graded=True
+        ).order_by('id')
+        self.assertEqual(len(data['submissions']), submissions.count())
+        for record, submission in zip(data['submissions'], submissions):
+            self.assertEqual(record['student']['student_id'], submission.student.studentprofile.student_id)
+            self.assertEqual(record['score'], submission.score)
+            self.assertEqual(record['answers'], submission.answers)
+            self.assertEqual(record['graded_at'], submission.graded_at.isoformat())
+            self.assertEqual(
+                sorted((score['question_id'], score['score'], score['teacher_comment']) for score in record['question_scores']),
+                sorted(submission.question_scores.values_list('question_id', 'score', 'teacher_comment')),
+            )
+
+    def test_jsonl_has_same_records_as_json(self):
+        archive = json.loads(''.join(iter_archive_json(self.assignment)))
+        lines = [json.loads(line) for line in ''.join(iter_archive_jsonl(self.assignment)).splitlines()]
+        self.assertEqual([line.pop('type') for line in lines],
+                         ['assignment'] + ['question'] * 4 + ['submission'] * len(archive['submissions']))
+        lines[0].pop('export_time')
+        archive['assignment'].pop('export_time')
+        self.assertEqual(lines[0], archive['assignment'])
+        self.assertEqual(lines[1:5], archive['questions'])
+        self.assertEqual(lines[5:], archive['submissions'])
+
+    def test_query_count_does_not_grow_with_submissions(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                ''.join(iter_archive_json(self.assignment))
+            return len(queries)
+
+        before = count_queries()
+        for submission in StudentSubmission.objects.filter(assignment=self.assignment, is_graded=False):
+            save_manual_grades(submission, [(question, 2, '') for question in self.questions], self.teacher)
+        # 题目得分按分块一次取出，不随提交数量增加查询
+        self.assertEqual(count_queries(), before)
+
+
+def column_index(reference):
+    """单元格引用的列序号（从 0 开始）：A1 -> 0，AA3 -> 26"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def read_xlsx_sheet(data, number):
+    """读取流式 XLSX 中一张工作表的值（数值转为 float，空单元格为 None）"""
+    namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        root = ElementTree.fromstring(workbook.read(f'xl/worksheets/sheet{number}.xml'))
+    rows = []
+    for row in root.iterfind('x:sheetData/x:row', namespace):
+        values = {}
+        for cell in row.iterfind('x:c', namespace):
+            if cell.get('t') == 'inlineStr':
+                value = cell.find('x:is/x:t', namespace).text or ''
+            else:
+                value = float(cell.find('x:v', namespace).text)
+            values[column_index(cell.get('r'))] = value
+        rows.append([values.get(index) for index in range(max(values, default=-1) + 1)])
+    return rows
+
+
+class XlsxExportTests(ExportDataMixin, TestCase):
+
+    def test_xlsx_matrix_matches_csv(self):
+        data = b''.join(iter_gradebook_xlsx(self.assignment, chunk_size=2))
+        with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            self.assertIn('<sheet name="汇总" sheetId="2"', workbook.read('xl/workbook.xml').decode())
+        matrix = read_xlsx_sheet(data, 1)
+        csv_rows = list(csv.reader(io.StringIO(''.join(iter_gradebook_csv(self.assignment))[1:])))[4:]
+        self.assertEqual(len(matrix), len(csv_rows))
+        for xlsx_row, csv_row in zip(matrix, csv_rows):
+            self.assertEqual(len(xlsx_row), len(csv_row))
+            for value, text in zip(xlsx_row, csv_row):
+                # 数值写为数值单元格，学号等字符串原样保存
+                if isinstance(value, float):
+                    self.assertEqual(value, float(text))
+                else:
+                    self.assertEqual(value or '', text)
+
+        summary = read_xlsx_sheet(data, 2)
+        self.assertEqual(summary[5], ['已批改提交', 5.0])
+
+    def test_non_finite_numbers_are_empty_cells(self):
+        self.assertEqual(cell_xml('A1', 1.5), '<c r="A1"><v>1.5</v></c>')
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.subTest(value=value):
+                self.assertEqual(cell_xml('A1', value), '')
+
+
+# ==================== 后台导出任务 ====================
+
+class ExportJobClaimTests(CourseDataMixin, TestCase):
+
+    def test_each_job_is_claimed_once_in_order(self):
+        assignment = create_assignment(self.teaching_class, self.teacher)
+        jobs = [
+            ExportJob.objects.create(created_by=self.teacher, assignment=assignment, export_format=export_format)
+            for export_format in ('xlsx', 'csv')
+        ]
+        first = ExportJob.claim_next()
+        second = ExportJob.claim_next()
+        self.assertEqual([first.pk, second.pk], [job.pk for job in jobs])
+        self.assertEqual((first.status, first.progress), ('running', 0))
+        self.assertIsNotNone(first.started_at)
+        self.assertIsNone(ExportJob.claim_next())
+
+    def test_finished_jobs_are_not_claimed(self):
+        assignment = create_assignment(self.teaching_class, self.teacher)
+        ExportJob.objects.create(created_by=self.teacher, assignment=assignment, status='done')
+        ExportJob.objects.create(created_by=self.teacher, assignment=assignment, status='failed')
+        self.assertIsNone(ExportJob.claim_next())
+
+    def test_set_progress_is_clamped(self):
+        job = ExportJob.objects.create(created_by=self.teacher, teaching_class=self.teaching_class)
+        job.set_progress(150)
+        self.assertEqual(ExportJob.objects.get(pk=job.pk).progress, 100)
+        job.set_progress(-5)
+        self.assertEqual(ExportJob.objects.get(pk=job.pk).progress, 0)
+
+
+# ==================== 教学班存档 ====================
+
+class ClassArchiveTests(CourseDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assignments = [create_assignment(cls.teaching_class, cls.teacher, title=f'作业{index}') for index in (1, 2)]
+        for assignment in cls.assignments:
+            questions = create_questions(assignment)
+            submission = StudentSubmission.objects.create(
+                assignment=assignment, student=cls.student, is_submitted=True, answers={}
+            )
+            save_manual_grades(submission, [(question, 2, '') for question in questions], cls.teacher)
+        # 没有已批改提交的作业不打包
+        create_assignment(cls.teaching_class, cls.teacher, title='未批改')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PRIVATE_EXPORT_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.archive_dir = os.path.join(root, ARCHIVE_DIR)
+        self.client.force_login(self.teacher)
+        self.url = reverse('core:class_export_archive', args=[self.teaching_class.id])
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return response, content
+
+    def test_first_download_streams_and_fills_cache(self):
+        response, content = self.download()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertTrue(response['Content-Disposition'].startswith("attachment; filename*=utf-8''"))
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(sorted(archive.namelist()), sorted(
+                archive_member_name(assignment, export_format)
+                for assignment in self.assignments for export_format in ('csv', 'json')
+            ))
+        self.assertEqual(len(os.listdir(self.archive_dir)), 1)
+
+        # 内容未变化：直接发送缓存文件，带 If-None-Match 时返回 304
+        cached, cached_content = self.download()
+        self.assertIsInstance(cached, FileResponse)
+        self.assertEqual(cached_content, content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+
+    def test_new_grades_replace_cached_version(self):
+        response, _ = self.download()
+        submission = StudentSubmission.objects.filter(assignment=self.assignments[0]).get()
+        entries = [(question, 5, '') for question in self.assignments[0].questions.all()]
+        save_manual_grades(submission, entries, self.teacher)
+
+        updated, _ = self.download(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], response['ETag'])
+        # 旧版本在新版本写完后删除
+        self.assertEqual(os.listdir(self.archive_dir), [os.path.basename(ArchiveCache(
+            self.teaching_class.id, updated['ETag'].strip('"')
+        ).name)])
+
+    def test_cache_file_removed_between_requests(self):
+        self.download()
+        for filename in os.listdir(self.archive_dir):
+            os.remove(os.path.join(self.archive_dir, filename))
+        response, content = self.download()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertTrue(zipfile.is_zipfile(io.BytesIO(content)))
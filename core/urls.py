@@ -17,9 +17,12 @@ urlpatterns = [
     # 讨论区相关URL
     path('forum/', views.forum_index, name='forum_index'),
     path('forum/category/<int:category_id>/', views.forum_category, name='forum_category'),
+    path('forum/search/', views.forum_search, name='forum_search'),
     path('forum/post/<int:post_id>/', views.forum_post_detail, name='forum_post_detail'),
+    path('forum/post/<int:post_id>/since/<int:reply_id>/', views.forum_post_replies_since, name='forum_post_replies_since'),
     path('forum/new/', views.forum_new_post, name='forum_new_post'),
     path('forum/reply/<int:post_id>/', views.forum_reply, name='forum_reply'),
+    path('forum/reply/<int:reply_id>/like/', views.forum_like_reply, name='forum_like_reply'),
     
     # 教学班管理相关URL
     path('class-management/', views.class_management, name='class_management'),
@@ -31,14 +34,21 @@ urlpatterns = [
     path('assignments/create/', views.assignment_create, name='assignment_create'),
     path('assignments/<int:assignment_id>/edit/', views.assignment_edit, name='assignment_edit'),
     path('assignments/<int:assignment_id>/take/', views.assignment_take, name='assignment_take'),
+    path('assignments/<int:assignment_id>/autosave/', views.assignment_autosave, name='assignment_autosave'),
     path('assignments/<int:assignment_id>/result/', views.assignment_result, name='assignment_result'),
     path('assignments/<int:assignment_id>/grade/', views.assignment_grade, name='assignment_grade'),
+    path('assignments/<int:assignment_id>/auto-grade/', views.assignment_auto_grade, name='assignment_auto_grade'),
     path('assignments/<int:assignment_id>/grade/<int:submission_id>/', views.assignment_grade_detail, name='assignment_grade_detail'),
     path('assignments/<int:assignment_id>/archive/', views.assignment_archive, name='assignment_archive'),
     
     # 作业导出相关URL
     path('assignments/<int:assignment_id>/export/', views.assignment_export_page, name='assignment_export_page'),
     path('assignments/<int:assignment_id>/export/excel/', views.assignment_export_excel, name='assignment_export_excel'),
+    path('assignments/<int:assignment_id>/export/csv/', views.assignment_export_csv, name='assignment_export_csv'),
     path('assignments/<int:assignment_id>/export/json/', views.assignment_export_json, name='assignment_export_json'),
     path('assignments/<int:assignment_id>/export/status/', views.assignment_export_status, name='assignment_export_status'),
+    path('assignments/<int:assignment_id>/export/jobs/', views.assignment_export_job_create, name='assignment_export_job_create'),
+    path('class/<int:class_id>/export/archive/', views.class_export_archive, name='class_export_archive'),
+    path('class/<int:class_id>/export/jobs/', views.class_export_job_create, name='class_export_job_create'),
+    path('exports/jobs/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
 ]
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+浏览次数写回缓冲
+
+每次浏览只在缓存中做一次原子自增，不写数据库；缓冲的增量按固定间隔批量写回，
+同一增量值的对象合并为一条 ``UPDATE ... SET view_count = view_count + n``。
+
+缓存结构（位于 VIEW_COUNT_CACHE_ALIAS 指定的缓存中）：
+
+- ``viewcount:<app_label.model>:<pk>``：该对象尚未写回的浏览增量
+- ``viewcount:log:<seq>``：计数从 0 变为 1 时登记的对象，写回时按序号区间读取
+- ``viewcount:seq`` / ``viewcount:flushed``：登记序号与已写回的序号
+
+使用 Redis 等共享缓存时，各 worker 的浏览量汇总到同一处，可由 flush_view_counters
+命令定时写回；使用进程内缓存时，各进程按间隔在后台线程中自行写回，不占用请求。
+
+缓冲必须使用独立的缓存别名：与其他数据共用缓存时，淘汰可能删掉尚未写回的增量或登记记录，
+这部分浏览就再也不会写回。进程内缓存（LocMemCache）超过 MAX_ENTRIES 时同样会淘汰，
+需要把上限设得足够大，见 check_cache_settings。
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import F
+
+from .ranking import VIEW_WEIGHT, add_event
+
+SEQ_KEY = 'viewcount:seq'
+FLUSHED_KEY = 'viewcount:flushed'
+THROTTLE_KEY = 'viewcount:throttle'
+LOCK_KEY = 'viewcount:lock'
+LOCK_TIMEOUT = 300
+# 使用进程内缓存时 MAX_ENTRIES 的下限：每个待写回的对象占两个键
+MIN_LOCMEM_ENTRIES = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def get_flush_interval():
+    """写回间隔（秒）；为 0 时请求中不写回，只由 flush_view_counters 命令写回"""
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 60)
+
+
+def get_cache_alias():
+    return getattr(settings, 'VIEW_COUNT_CACHE_ALIAS', 'view_counts')
+
+
+def _cache():
+    return caches[get_cache_alias()]
+
+
+def check_cache_settings(app_configs=None, **kwargs):
+    """系统检查：缓冲使用独立的缓存别名，进程内缓存的容量足够大"""
+    alias = get_cache_alias()
+    if alias not in settings.CACHES:
+        return [checks.Error(
+            f'VIEW_COUNT_CACHE_ALIAS 指定的缓存 "{alias}" 不存在',
+            hint='在 CACHES 中为浏览次数缓冲单独配置一个缓存',
+            id='core.E001',
+        )]
+    if alias == 'default' or alias == getattr(settings, 'RENDER_CACHE_ALIAS', 'default'):
+        return [checks.Error(
+            f'浏览次数缓冲不能与其他数据共用缓存 "{alias}"',
+            hint='其他数据触发的淘汰会删掉尚未写回的浏览增量，请为 VIEW_COUNT_CACHE_ALIAS 配置独立的缓存',
+            id='core.E002',
+        )]
+    config = settings.CACHES[alias]
+    if config.get('BACKEND') == 'django.core.cache.backends.locmem.LocMemCache':
+        max_entries = config.get('OPTIONS', {}).get('MAX_ENTRIES', 300)
+        if max_entries < MIN_LOCMEM_ENTRIES:
+            return [checks.Warning(
+                f'浏览次数缓冲使用进程内缓存，MAX_ENTRIES={max_entries} 过小',
+                hint=(f'超过上限时会淘汰尚未写回的增量；请把 MAX_ENTRIES 设为至少 {MIN_LOCMEM_ENTRIES}，'
+                      '或改用 Redis 等共享缓存'),
+                id='core.W001',
+            )]
+    return []
+
+
+def _counter_key(label, pk):
+    return f'viewcount:{label}:{pk}'
+
+
+def _log_key(seq):
+    return f'viewcount:log:{seq}'
+
+
+def _incr(cache, key, delta=1):
+    """原子自增，键不存在时创建；返回自增后的值"""
+    if cache.add(key, delta, timeout=None):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # 键恰好在 add 之后被删除或淘汰
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+
+def _register(cache, label, pk):
+    seq = _incr(cache, SEQ_KEY)
+    cache.set(_log_key(seq), f'{label}:{pk}', timeout=None)
+
+
+def record_view(obj):
+    """记录一次浏览；到达写回间隔时在后台线程中写回缓冲，不阻塞当前请求"""
+    cache = _cache()
+    label = obj._meta.label_lower
+    # 计数从 0 变为 1 时登记，之后的自增无需再登记
+    if _incr(cache, _counter_key(label, obj.pk)) == 1:
+        _register(cache, label, obj.pk)
+    interval = get_flush_interval()
+    if interval and cache.add(THROTTLE_KEY, 1, timeout=interval):
+        _register_exit_flush()
+        threading.Thread(target=_background_flush, name='view-count-flush', daemon=True).start()
+
+
+def _background_flush():
+    try:
+        flush_view_counts()
+    except Exception:
+        logger.exception('浏览次数写回失败，增量已放回缓冲')
+    finally:
+        connection.close()
+
+
+def _drain(cache):
+    """取出登记区间内的全部增量，返回 {label: {pk: delta}}"""
+    done = cache.get(FLUSHED_KEY) or 0
+    current = cache.get(SEQ_KEY) or 0
+    if current <= done:
+        return {}
+    log_keys = [_log_key(seq) for seq in range(done + 1, current + 1)]
+    entries = set(cache.get_many(log_keys).values())
+
+    pending = defaultdict(dict)
+    for entry in entries:
+        label, pk = entry.rsplit(':', 1)
+        key = _counter_key(label, pk)
+        delta = cache.get(key) or 0
+        if delta <= 0:
+            continue
+        try:
+            remaining = cache.decr(key, delta)
+        except ValueError:
+            continue
+        pending[label][pk] = delta
+        # 读取与扣减之间又有新的浏览，但它们没有登记，重新登记一次
+        if remaining > 0:
+            _register(cache, label, pk)
+
+    cache.delete_many(log_keys)
+    cache.set(FLUSHED_KEY, current, timeout=None)
+    return pending
+
+
+def _apply(pending):
+    """按增量值分组，每组一条 UPDATE 写回"""
+    updated = {}
+    with transaction.atomic():
+        for label, deltas in pending.items():
+            model = apps.get_model(label)
+            by_delta = defaultdict(list)
+            for pk, delta in deltas.items():
+                by_delta[delta].append(pk)
+            # 有热度字段的模型（讨论帖）同时累加浏览带来的热度
+            has_hot_score = any(field.name == 'hot_score' for field in model._meta.fields)
+            for delta, pks in by_delta.items():
+                updates = {'view_count': F('view_count') + delta}
+                if has_hot_score:
+                    updates['hot_score'] = add_event(VIEW_WEIGHT * delta)
+                model.objects.filter(pk__in=pks).update(**updates)
+            updated[label] = deltas
+    return updated
+
+
+def flush_view_counts():
+    """把缓冲中的浏览增量写回数据库，返回 {label: {pk: delta}}；已有写回在进行时直接返回"""
+    cache = _cache()
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return {}
+    try:
+        pending = _drain(cache)
+        if not pending:
+            return {}
+        try:
+            return _apply(pending)
+        except Exception:
+            # 写回失败时把增量放回缓冲，留待下次写回
+            for label, deltas in pending.items():
+                for pk, delta in deltas.items():
+                    if _incr(cache, _counter_key(label, pk), delta) == delta:
+                        _register(cache, label, pk)
+            raise
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+_exit_flush_lock = threading.Lock()
+_exit_flush_registered = False
+
+
+def _register_exit_flush():
+    """
+    本进程第一次在后台写回时登记退出时的写回。
+    只由 flush_view_counters 命令写回（间隔为 0）的进程不登记，
+    退出时不会把缓冲写进彼时配置的数据库（例如测试结束后的正式数据库）。
+    """
+    global _exit_flush_registered
+    with _exit_flush_lock:
+        if not _exit_flush_registered:
+            atexit.register(_flush_on_exit)
+            _exit_flush_registered = True
+
+
+def _flush_on_exit():
+    # 进程退出时写回本进程缓存中剩余的增量
+    try:
+        flush_view_counts()
+    except Exception:
+        logger.exception('进程退出时写回浏览次数失败')
@@ -2,14 +2,31 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.middleware.csrf import get_token
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, quote_etag
 from django.utils import timezone
 from django.db import models
+from collections import defaultdict
 from datetime import datetime
+import hashlib
 import json
-from .models import User, TeacherProfile, StudentProfile, Class, TeachingClass, VideoResource, ForumCategory, ForumPost, ForumReply, ForumLike, PostReadStatus, Assignment, Question, StudentSubmission, QuestionScore
+import math
+from .models import User, TeacherProfile, StudentProfile, Class, TeachingClass, VideoResource, ForumCategory, ForumPost, ForumReply, ForumLike, PostReadStatus, Assignment, Question, StudentSubmission, QuestionScore, ExportJob
 from .forms import StudentRegistrationForm, LoginForm
+from .class_exports import ArchiveCache, class_archive, iter_class_archive_members
+from .counters import get_badge_counts, get_user_counters
+from .exports import EXPORT_FORMATS, exportable_assignments, iter_archive_json, iter_archive_jsonl, iter_gradebook_csv, iter_gradebook_xlsx
+from .grading import auto_grade_assignment, save_manual_grades
+from .pagination import KeysetPaginator
+from .rendering import render_body
+from .search import search as search_forum
+from .xlsx import CONTENT_TYPE as XLSX_CONTENT_TYPE
+from .zipstream import iter_zip
 
 def home(request):
     """首页视图"""
@@ -888,88 +905,105 @@ def get_courses_data():
 
 # ==================== 讨论区视图函数 ====================
 
+def _attach_latest_replies(posts, id_attr, reply_attr):
+    """按帖子上注解的回复ID一次性取出回复，挂到帖子的指定属性上"""
+    reply_ids = [getattr(post, id_attr) for post in posts if getattr(post, id_attr)]
+    replies = ForumReply.objects.select_related('author').in_bulk(reply_ids)
+    for post in posts:
+        setattr(post, reply_attr, replies.get(getattr(post, id_attr)))
+    return posts
+
+
 def get_user_related_posts(user):
-    """获取与用户相关的帖子"""
+    """获取与用户相关的帖子（查询次数固定，与历史帖子数量无关）"""
     related_posts = []
     
     if user.user_type == 'student':
-        # 学生：获取教师回复了自己帖子的帖子
-        student_posts = ForumPost.objects.filter(author=user).prefetch_related('replies')
-        for post in student_posts:
-            # 检查是否有教师回复
-            teacher_replies = post.replies.filter(author__user_type='teacher')
-            if teacher_replies.exists():
-                # 获取最新的教师回复
-                latest_teacher_reply = teacher_replies.order_by('-created_at').first()
-                post.latest_teacher_reply = latest_teacher_reply
-                related_posts.append(post)
+        # 学生：获取教师回复了自己帖子的帖子，并带上最新的教师回复
+        latest_teacher_reply = ForumReply.objects.filter(
+            post=models.OuterRef('pk'),
+            author__user_type='teacher'
+        ).order_by('-created_at', '-id').values('id')[:1]
+        related_posts = list(
+            ForumPost.objects.filter(author=user).annotate(
+                latest_teacher_reply_id=models.Subquery(latest_teacher_reply)
+            ).filter(latest_teacher_reply_id__isnull=False)[:10]
+        )
+        _attach_latest_replies(related_posts, 'latest_teacher_reply_id', 'latest_teacher_reply')
     
     elif user.user_type == 'teacher':
         # 教师：获取学生发给自己的私信帖子（未回复的优先）
-        teaching_classes = TeachingClass.objects.filter(created_by=user)
-        private_posts = ForumPost.objects.filter(
+        latest_reply = ForumReply.objects.filter(
+            post=models.OuterRef('pk'),
+            author=user
+        ).order_by('-created_at', '-id').values('id')[:1]
+        private_posts = ForumPost.objects.visible_to(user).filter(
             visibility='teacher_only',
-            teaching_class__in=teaching_classes
-        ).select_related('author', 'category', 'teaching_class').order_by('-created_at')
-        
-        # 分为已回复和未回复
-        unreplied_posts = []
-        replied_posts = []
+            teaching_class__created_by=user
+        ).select_related('author', 'category', 'teaching_class').annotate(
+            latest_reply_id=models.Subquery(latest_reply)
+        ).order_by('-created_at')
         
-        for post in private_posts:
-            if post.can_view(user):
-                teacher_replies = post.replies.filter(author=user)
-                if teacher_replies.exists():
-                    post.latest_reply = teacher_replies.order_by('-created_at').first()
-                    replied_posts.append(post)
-                else:
-                    unreplied_posts.append(post)
+        # 分为已回复和未回复，未回复的排在前面
+        unreplied_posts = list(private_posts.filter(latest_reply_id__isnull=True)[:5])
+        replied_posts = list(private_posts.filter(latest_reply_id__isnull=False)[:5])
+        _attach_latest_replies(replied_posts, 'latest_reply_id', 'latest_reply')
         
-        # 未回复的排在前面
-        related_posts = unreplied_posts[:5] + replied_posts[:5]
+        related_posts = unreplied_posts + replied_posts
     
-    return related_posts[:10]
+    return related_posts
+
 
 @login_required
 def forum_index(request):
     """讨论区首页 - 仅限注册用户"""
-    categories = ForumCategory.objects.filter(is_active=True)
+    # 各标签页共用的上下文：分类、与我相关的帖子、私信入口
+    context = {
+        'categories': ForumCategory.objects.filter(is_active=True),
+        'related_posts': get_user_related_posts(request.user),
+        'show_private_filter': request.user.user_type == 'teacher',
+    }
     
     # 检查是否有筛选参数
     filter_type = request.GET.get('filter')
     
     if filter_type == 'private_messages' and request.user.user_type == 'teacher':
         # 教师查看私信帖子
-        teaching_classes = TeachingClass.objects.filter(created_by=request.user)
-        all_posts = ForumPost.objects.filter(
+        private_posts = ForumPost.objects.visible_to(request.user).filter(
             visibility='teacher_only',
-            teaching_class__in=teaching_classes
+            teaching_class__created_by=request.user
         ).select_related('author', 'category', 'last_reply_by', 'teaching_class').order_by('-created_at')
+        page = KeysetPaginator(private_posts, per_page=20).page(request.GET.get('cursor'))
         
-        # 筛选出用户可见的帖子
-        recent_posts = [post for post in all_posts if post.can_view(request.user)][:20]
-        
-        context = {
+        context.update({
             'title': '学生私信 - 讨论区',
-            'categories': categories,
-            'recent_posts': recent_posts,
+            'recent_posts': page.object_list,
+            'page': page,
             'filter_type': 'private_messages',
-            'show_private_filter': True,
-        }
+        })
+    elif filter_type == 'hot':
+        # 热门讨论：按存储的热度排序，走 forumpost_hot_idx 索引，请求时不做任何聚合
+        hot_posts = ForumPost.objects.visible_to(request.user).select_related(
+            'author', 'category', 'last_reply_by', 'teaching_class'
+        ).order_by('-hot_score', '-id')
+        page = KeysetPaginator(hot_posts, per_page=20).page(request.GET.get('cursor'))
+        
+        context.update({
+            'title': '热门讨论 - 讨论区',
+            'recent_posts': page.object_list,
+            'page': page,
+            'filter_type': 'hot',
+        })
     else:
         # 获取用户可见的最近帖子
-        all_recent_posts = ForumPost.objects.select_related('author', 'category', 'last_reply_by', 'teaching_class')[:50]
-        recent_posts = [post for post in all_recent_posts if post.can_view(request.user)][:10]
-        
-        # 获取与当前用户相关的帖子
-        related_posts = get_user_related_posts(request.user)
+        recent_posts = ForumPost.objects.visible_to(request.user).select_related(
+            'author', 'category', 'last_reply_by', 'teaching_class'
+        )[:10]
         
-        context = {
+        context.update({
             'title': '互助讨论区',
-            'categories': categories,
             'recent_posts': recent_posts,
-            'related_posts': related_posts,
-        }
+        })
     
     return render(request, 'core/forum/index.html', context)
 
@@ -979,21 +1013,106 @@ def forum_category(request, category_id):
     """分类页面 - 仅限注册用户"""
     category = get_object_or_404(ForumCategory, id=category_id, is_active=True)
     
-    # 获取用户可见的帖子
-    all_posts = ForumPost.objects.filter(category=category).select_related('author', 'last_reply_by', 'teaching_class')
-    posts = [post for post in all_posts if post.can_view(request.user)]
+    # 获取用户可见的帖子（游标分页）
+    posts = ForumPost.objects.visible_to(request.user).filter(
+        category=category
+    ).select_related('author', 'last_reply_by', 'teaching_class')
+    page = KeysetPaginator(posts, per_page=20).page(request.GET.get('cursor'))
     
     context = {
         'title': f'{category.name} - 讨论区',
         'category': category,
-        'posts': posts,
+        'posts': page.object_list,
+        'page': page,
     }
     return render(request, 'core/forum/category.html', context)
 
 
+def build_reply_thread(post, user, cursor=None, per_page=20):
+    """
+    组装帖子的回复楼层：顶层回复游标分页，本页楼层下的楼中楼回复按所属楼层（root）一次取出，
+    在内存中建树；当前用户的点赞状态一次查询。查询次数与楼层数和嵌套深度无关。
+    返回 (分页对象, 按深度优先展开的回复列表)，每条回复带有 depth、thread_children 和 liked_by_user 属性。
+    """
+    top_level = ForumReply.objects.filter(post=post, parent__isnull=True).select_related('author')
+    page = KeysetPaginator(top_level, per_page=per_page).page(cursor)
+    
+    children = defaultdict(list)
+    nested = ForumReply.objects.filter(
+        root_id__in=[reply.id for reply in page.object_list]
+    ).select_related('author').order_by('created_at', 'id')
+    for reply in nested:
+        children[reply.parent_id].append(reply)
+    
+    thread = []
+    
+    def walk(reply, depth):
+        reply.depth = depth
+        reply.thread_children = children.get(reply.id, [])
+        thread.append(reply)
+        for child in reply.thread_children:
+            walk(child, depth + 1)
+    
+    for reply in page.object_list:
+        walk(reply, 0)
+    
+    liked_ids = ForumLike.liked_reply_ids(user, [reply.id for reply in thread])
+    for reply in thread:
+        reply.liked_by_user = reply.id in liked_ids
+    
+    return page, thread
+
+
 @login_required
+def forum_search(request):
+    """讨论区全文检索 - 仅返回用户有权查看的帖子和回复"""
+    query = request.GET.get('q', '').strip()
+    results = search_forum(request.user, query) if query else []
+    
+    context = {
+        'title': f'搜索：{query} - 讨论区' if query else '搜索 - 讨论区',
+        'query': query,
+        'results': results,
+    }
+    return render(request, 'core/forum/search.html', context)
+
+
+def forum_post_detail_etag(request, post_id):
+    """
+    帖子详情页的 ETag：由帖子修改时间、回复数、最后回复和回复修改时间、点赞总数，
+    以及当前用户、CSRF 令牌、所在页和导航栏角标共同决定。无权查看或有待显示的提示消息时不生成。
+    """
+    if not request.user.is_authenticated or len(messages.get_messages(request)):
+        return None
+    # 回复数和最后修改时间按回复表实时聚合，不依赖可能滞后的冗余计数字段
+    post = ForumPost.objects.filter(id=post_id).annotate(
+        total_likes=models.Sum('replies__like_count'),
+        live_reply_count=models.Count('replies'),
+        last_reply_updated_at=models.Max('replies__updated_at'),
+    ).first()
+    if post is None or not post.can_view(request.user):
+        return None
+    # 页面中的表单嵌有 CSRF 令牌，令牌轮换（如重新登录）后旧页面提交会 403，因此令牌也参与计算。
+    # get_token 每次返回加了随机掩码的值，这里取 META 中未加掩码的密钥
+    get_token(request)
+    # 角标计数行单独读取，不占用请求内的角标缓存（视图中标记已读后计数会变化）
+    counters = get_user_counters(request.user)
+    parts = [
+        post.pk, post.updated_at.isoformat(), post.reply_count, post.live_reply_count,
+        post.last_reply_at.isoformat() if post.last_reply_at else '',
+        post.last_reply_updated_at.isoformat() if post.last_reply_updated_at else '',
+        post.total_likes or 0,
+        request.user.pk, request.META.get('CSRF_COOKIE', ''), request.GET.get('cursor', ''),
+        counters.unread_private_messages, counters.unread_replies, counters.pending_assignments,
+    ]
+    return hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=forum_post_detail_etag)
 def forum_post_detail(request, post_id):
-    """帖子详情页面 - 仅限注册用户"""
+    """帖子详情页面 - 仅限注册用户；内容未变化时返回 304，不计浏览次数"""
     post = get_object_or_404(ForumPost, id=post_id)
     
     # 检查用户是否有权限查看此帖子
@@ -1003,19 +1122,17 @@ def forum_post_detail(request, post_id):
     
     post.increment_view_count()
     
-    # 如果是学生查看自己的帖子，标记为已读
-    if request.user.user_type == 'student' and post.author == request.user:
-        try:
-            read_status, created = PostReadStatus.objects.get_or_create(
-                user=request.user,
-                post=post
-            )
-            read_status.mark_as_read()
-        except Exception:
-            # 如果数据库表不存在，暂时跳过
-            pass
+    # 如果是学生查看自己的帖子，标记为已读：已读数没有变化时不写数据库，否则一条 upsert
+    if request.user.user_type == 'student' and post.author_id == request.user.id:
+        read_count = PostReadStatus.objects.filter(
+            user=request.user, post=post
+        ).values_list('read_replies_count', flat=True).first()
+        if read_count != post.reply_count:
+            PostReadStatus.mark_read(request.user, post)
+            # upsert 不触发信号，手动刷新角标计数
+            get_badge_counts(request).refresh()
     
-    replies = ForumReply.objects.filter(post=post).select_related('author')
+    page, replies = build_reply_thread(post, request.user, request.GET.get('cursor'))
     
     # 检查用户是否可以回复
     can_reply = post.can_reply(request.user)
@@ -1024,11 +1141,45 @@ def forum_post_detail(request, post_id):
         'title': post.title,
         'post': post,
         'replies': replies,
+        'page': page,
         'can_reply': can_reply,
+        'latest_reply_id': post.replies.aggregate(latest=models.Max('id'))['latest'] or 0,
     }
     return render(request, 'core/forum/post_detail.html', context)
 
 
+@login_required
+def forum_post_replies_since(request, post_id, reply_id):
+    """轮询新回复（AJAX）- 只返回ID大于 reply_id 的回复，不渲染整页也不计浏览次数"""
+    post = get_object_or_404(ForumPost, id=post_id)
+    
+    if not post.can_view(request.user):
+        return JsonResponse({'success': False, 'message': '您没有权限查看此帖子'}, status=403)
+    
+    new_replies = list(
+        post.replies.filter(id__gt=reply_id).select_related('author').order_by('id')[:50]
+    )
+    liked_ids = ForumLike.liked_reply_ids(request.user, [reply.id for reply in new_replies])
+    
+    return JsonResponse({
+        'success': True,
+        'reply_count': post.reply_count,
+        'replies': [
+            {
+                'id': reply.id,
+                'parent_id': reply.parent_id,
+                'author': reply.author.real_name or reply.author.username,
+                'content_html': render_body(reply),
+                'created_at': timezone.localtime(reply.created_at).strftime('%m月%d日 %H:%M'),
+                'like_count': reply.like_count,
+                'liked': reply.id in liked_ids,
+                'is_best_answer': reply.is_best_answer,
+            }
+            for reply in new_replies
+        ],
+    })
+
+
 @login_required
 def forum_new_post(request):
     """发布新帖"""
@@ -1107,19 +1258,21 @@ def forum_reply(request, post_id):
     
     content = request.POST.get('content')
     
+    # 楼中楼回复：父回复必须属于同一帖子
+    parent = None
+    parent_id = request.POST.get('parent_id', '')
+    if parent_id.isdigit():
+        parent = ForumReply.objects.filter(id=parent_id, post=post).first()
+    
     if content:
-        reply = ForumReply.objects.create(
+        # 回复统计在 ForumReply.save 中随插入一并更新
+        ForumReply.objects.create(
             post=post,
             content=content,
-            author=request.user
+            author=request.user,
+            parent=parent
         )
         
-        # 更新帖子的回复统计
-        post.reply_count += 1
-        post.last_reply_at = reply.created_at
-        post.last_reply_by = request.user
-        post.save(update_fields=['reply_count', 'last_reply_at', 'last_reply_by'])
-        
         messages.success(request, '回复成功！')
     else:
         messages.error(request, '回复内容不能为空')
@@ -1127,6 +1280,33 @@ def forum_reply(request, post_id):
     return redirect('core:forum_post_detail', post_id=post_id)
 
 
+@login_required
+@require_POST
+def forum_like_reply(request, reply_id):
+    """点赞/取消点赞回复（AJAX）- action 为 like 或 unlike 时幂等，省略时切换当前状态"""
+    reply = get_object_or_404(ForumReply.objects.select_related('post'), id=reply_id)
+    
+    if not reply.post.can_view(request.user):
+        return JsonResponse({'success': False, 'message': '您没有权限查看此帖子'}, status=403)
+    
+    action = request.POST.get('action')
+    if action not in ('like', 'unlike'):
+        liked = reply.id in ForumLike.liked_reply_ids(request.user, [reply.id])
+        action = 'unlike' if liked else 'like'
+    
+    if action == 'like':
+        ForumLike.like(request.user, reply.id)
+    else:
+        ForumLike.unlike(request.user, reply.id)
+    
+    like_count = ForumReply.objects.filter(id=reply.id).values_list('like_count', flat=True).first() or 0
+    return JsonResponse({
+        'success': True,
+        'liked': action == 'like',
+        'like_count': like_count,
+    })
+
+
 # ==================== 教学班管理视图函数 ====================
 
 @login_required
@@ -1272,32 +1452,22 @@ def assignment_index(request):
 
 def assignment_teacher_index(request):
     """教师作业管理首页"""
-    # 获取该教师创建的所有作业（包括已归档的）
-    all_assignments = Assignment.objects.filter(created_by=request.user).order_by('-created_at')
+    # 获取该教师创建的所有作业（包括已归档的），提交统计随列表一次查出
+    all_assignments = Assignment.objects.filter(created_by=request.user)
+    assignments = all_assignments.select_related('teaching_class').with_submission_stats().order_by('-created_at')
     
     # 分类作业
-    active_assignments = all_assignments.exclude(status='archived')
-    archived_assignments = all_assignments.filter(status='archived')
-    
-    # 统计信息
-    total_assignments = all_assignments.count()
-    published_assignments = active_assignments.filter(status='published').count()
-    archived_count = archived_assignments.count()
-    pending_grading = 0
+    active_assignments = assignments.exclude(status='archived')
+    archived_assignments = assignments.filter(status='archived')
     
-    for assignment in active_assignments.filter(status='published'):
-        pending_grading += assignment.submission_count - assignment.graded_count
+    # 统计信息（一条聚合查询）
+    stats = all_assignments.dashboard_stats()
     
     context = {
         'title': '作业管理',
         'assignments': active_assignments,
         'archived_assignments': archived_assignments,
-        'stats': {
-            'total_assignments': total_assignments,
-            'published_assignments': published_assignments,
-            'archived_count': archived_count,
-            'pending_grading': pending_grading,
-        }
+        'stats': stats,
     }
     return render(request, 'core/assignments/teacher_index.html', context)
 
@@ -1311,11 +1481,14 @@ def assignment_student_index(request):
         messages.error(request, '您尚未加入教学班，无法查看作业')
         return redirect('core:home')
     
-    # 获取该教学班的所有已发布作业
-    all_assignments = Assignment.objects.filter(
+    # 获取该教学班的所有已发布作业，学生的提交记录ID和题目数随查询一并取出
+    all_assignments = list(Assignment.objects.filter(
         teaching_class=teaching_class,
         status='published'
-    ).order_by('-publish_time')
+    ).with_student_submission(request.user).order_by('-publish_time'))
+    submissions = StudentSubmission.objects.in_bulk(
+        [assignment.student_submission_id for assignment in all_assignments if assignment.student_submission_id]
+    )
     
     # 分类作业
     pending_assignments = []      # 未开始的作业
@@ -1323,8 +1496,10 @@ def assignment_student_index(request):
     completed_assignments = []    # 已正式提交的作业
     overdue_assignments = []      # 已逾期的作业
     
+    now = timezone.now()
     for assignment in all_assignments:
-        submission = assignment.get_student_submission(request.user)
+        submission = submissions.get(assignment.student_submission_id)
+        assignment.past_due = now > assignment.due_time
         
         if submission and submission.is_submitted:
             # 已正式提交的作业
@@ -1338,7 +1513,7 @@ def assignment_student_index(request):
                 'assignment': assignment,
                 'submission': submission
             })
-        elif assignment.is_due and not assignment.allow_late_submission:
+        elif assignment.past_due and not assignment.allow_late_submission:
             # 已逾期且不允许迟交的作业
             overdue_assignments.append(assignment)
         else:
@@ -1879,9 +2054,11 @@ def assignment_take(request, assignment_id):
             # 更新或创建草稿提交记录
             if existing_submission:
                 # 更新现有提交的答案（如果还未正式提交）
-                if not existing_submission.is_submitted:
-                    existing_submission.answers = answers
-                    existing_submission.save()
+                # 版本号在数据库中加一，与并发的自动保存不会互相覆盖版本；草稿已被正式提交时不写入
+                updated = StudentSubmission.objects.filter(
+                    pk=existing_submission.pk, is_submitted=False
+                ).update(answers=answers, revision=models.F('revision') + 1)
+                if updated:
                     messages.success(request, '草稿已保存！')
                 else:
                     messages.warning(request, '作业已提交，无法保存草稿')
@@ -1908,10 +2085,83 @@ def assignment_take(request, assignment_id):
         'questions': questions,
         'existing_submission': existing_submission,
         'saved_answers': saved_answers,
+        'draft_revision': existing_submission.revision if existing_submission and not existing_submission.is_submitted else 0,
     }
     return render(request, 'core/assignments/take.html', context)
 
 
+@login_required
+@require_POST
+def assignment_autosave(request, assignment_id):
+    """
+    自动保存草稿（AJAX）- 请求体为 {"revision": 版本号, "answers": {题目ID: 答案}}，只包含有变化的题目。
+    版本号与草稿当前版本一致时合并写入并返回新版本号；不一致时返回 409 和最新的草稿答案。
+    """
+    if request.user.user_type != 'student':
+        return JsonResponse({'success': False, 'message': '只有学生可以完成作业'}, status=403)
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    
+    # 检查学生是否属于该教学班
+    teaching_class_id = StudentProfile.objects.filter(
+        user=request.user
+    ).values_list('teaching_class_id', flat=True).first()
+    if teaching_class_id != assignment.teaching_class_id:
+        return JsonResponse({'success': False, 'message': '您不属于该作业的教学班'}, status=403)
+    
+    if not assignment.can_student_submit(request.user):
+        return JsonResponse({'success': False, 'message': '该作业当前不可提交'}, status=403)
+    
+    try:
+        payload = json.loads(request.body)
+        revision = int(payload.get('revision', 0))
+        changes = payload.get('answers') or {}
+        if not isinstance(changes, dict):
+            raise ValueError
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'message': '请求格式不正确'}, status=400)
+    
+    # 只接受本作业的题目，答案格式与整页保存一致
+    question_types = dict(assignment.questions.filter(
+        id__in=[key for key in changes if str(key).isdigit()]
+    ).values_list('id', 'question_type'))
+    answers = {}
+    for key, value in changes.items():
+        question_type = question_types.get(int(key)) if str(key).isdigit() else None
+        if question_type is None:
+            return JsonResponse({'success': False, 'message': f'题目 {key} 不属于该作业'}, status=400)
+        if question_type == 'multiple_choice' and isinstance(value, list):
+            value = ','.join(str(choice) for choice in value)
+        answers[str(key)] = str(value if value is not None else '').strip()
+    
+    submission = assignment.get_student_submission(request.user)
+    if submission and submission.is_submitted:
+        return JsonResponse({'success': False, 'message': '作业已提交，无法保存草稿'}, status=409)
+    
+    if submission is None:
+        if revision != 0:
+            return JsonResponse({'success': False, 'conflict': True, 'revision': 0, 'answers': {}}, status=409)
+        submission = StudentSubmission.objects.create(
+            assignment=assignment,
+            student=request.user,
+            answers=answers,
+            is_submitted=False,
+            revision=1
+        )
+        return JsonResponse({'success': True, 'revision': submission.revision})
+    
+    new_revision = submission.merge_draft_answers(revision, answers)
+    if new_revision is None:
+        submission.refresh_from_db(fields=['answers', 'revision'])
+        return JsonResponse({
+            'success': False,
+            'conflict': True,
+            'revision': submission.revision,
+            'answers': submission.answers,
+        }, status=409)
+    return JsonResponse({'success': True, 'revision': new_revision})
+
+
 @login_required
 def assignment_result(request, assignment_id):
     """查看作业结果"""
@@ -1989,6 +2239,48 @@ def assignment_result(request, assignment_id):
         return redirect('core:assignment_index')
 
 
+@login_required
+@require_POST
+def assignment_auto_grade(request, assignment_id):
+    """客观题自动判分 - 仅限教师"""
+    if request.user.user_type != 'teacher':
+        messages.error(request, '只有教师可以批改作业')
+        return redirect('core:assignment_index')
+    
+    assignment = get_object_or_404(Assignment, id=assignment_id, created_by=request.user)
+    result = auto_grade_assignment(assignment, graded_by=request.user)
+    
+    if result.submissions:
+        messages.success(request, f'自动判分完成：{result}')
+    else:
+        messages.info(request, '没有需要自动判分的客观题或正式提交')
+    return redirect('core:assignment_result', assignment_id=assignment.id)
+
+
+def parse_grading_form(data, questions):
+    """从批改表单读取各题得分和评语，返回 [(题目, 得分, 评语), ...]；得分不是有限的数字时抛出 ValueError"""
+    entries = []
+    for question in questions:
+        score = float(data.get(f'question_{question.id}_score') or 0)
+        # float() 接受 'nan'、'inf'，写入后总分和导出都会出错
+        if not math.isfinite(score):
+            raise ValueError(f'得分不是有限的数字：{score}')
+        comment = data.get(f'question_{question.id}_comment', '').strip()
+        entries.append((question, score, comment))
+    return entries
+
+
+def parse_initial_scores(data, questions):
+    """批改表单渲染时预填的各题得分（隐藏字段），用来判断教师是否改动过；缺失或无效的按 0 处理"""
+    initial_scores = {}
+    for question in questions:
+        try:
+            initial_scores[question.id] = float(data.get(f'question_{question.id}_initial') or 0)
+        except ValueError:
+            initial_scores[question.id] = 0
+    return initial_scores
+
+
 @login_required
 def assignment_grade(request, assignment_id):
     """批改作业 - 仅限教师"""
@@ -2003,35 +2295,17 @@ def assignment_grade(request, assignment_id):
         submission_id = request.POST.get('submission_id')
         submission = get_object_or_404(StudentSubmission, id=submission_id, assignment=assignment)
         
-        # 更新各题得分
-        total_score = 0
-        for question in assignment.questions.all():
-            score_key = f'question_{question.id}_score'
-            comment_key = f'question_{question.id}_comment'
-            
-            score = float(request.POST.get(score_key, 0))
-            comment = request.POST.get(comment_key, '').strip()
-            
-            # 更新或创建题目得分记录
-            question_score, created = QuestionScore.objects.get_or_create(
-                submission=submission,
-                question=question,
-                defaults={'score': score, 'teacher_comment': comment}
-            )
-            if not created:
-                question_score.score = score
-                question_score.teacher_comment = comment
-                question_score.save()
-            
-            total_score += score
+        try:
+            entries = parse_grading_form(request.POST, assignment.questions.all())
+        except ValueError:
+            messages.error(request, '得分必须是有效数字')
+            return redirect('core:assignment_grade', assignment_id=assignment.id)
         
-        # 更新提交记录
-        submission.score = total_score
-        submission.teacher_comments = request.POST.get('teacher_comments', '').strip()
-        submission.is_graded = True
-        submission.graded_by = request.user
-        submission.graded_at = timezone.now()
-        submission.save()
+        # 各题得分与提交总分在同一事务中批量写入
+        save_manual_grades(
+            submission, entries, request.user,
+            teacher_comments=request.POST.get('teacher_comments', '').strip()
+        )
         
         messages.success(request, f'已完成对 {submission.student.real_name} 作业的批改')
         return redirect('core:assignment_result', assignment_id=assignment.id)
@@ -2055,53 +2329,34 @@ def assignment_grade_detail(request, assignment_id, submission_id):
     submission = get_object_or_404(StudentSubmission, id=submission_id, assignment=assignment)
     
     if request.method == 'POST':
-        # 处理批改提交
-        total_score = 0
-        
-        for question in assignment.questions.all():
-            score_key = f'question_{question.id}_score'
-            comment_key = f'question_{question.id}_comment'
-            
-            score = float(request.POST.get(score_key, 0))
-            comment = request.POST.get(comment_key, '').strip()
-            
-            # 更新或创建题目得分记录
-            question_score, created = QuestionScore.objects.get_or_create(
-                submission=submission,
-                question=question,
-                defaults={'score': score, 'teacher_comment': comment}
-            )
-            if not created:
-                question_score.score = score
-                question_score.teacher_comment = comment
-                question_score.save()
-            
-            total_score += score
+        # 处理批改提交：各题得分与提交总分在同一事务中批量写入
+        try:
+            entries = parse_grading_form(request.POST, assignment.questions.all())
+        except ValueError:
+            messages.error(request, '得分必须是有效数字')
+            return redirect('core:assignment_grade_detail', assignment_id=assignment.id, submission_id=submission.id)
         
-        # 更新提交记录
-        submission.score = total_score
-        submission.teacher_comments = request.POST.get('teacher_comments', '').strip()
-        submission.is_graded = True
-        submission.graded_by = request.user
-        submission.graded_at = timezone.now()
-        submission.save()
+        save_manual_grades(
+            submission, entries, request.user,
+            teacher_comments=request.POST.get('teacher_comments', '').strip(),
+            initial_scores=parse_initial_scores(request.POST, assignment.questions.all())
+        )
         
         messages.success(request, f'已完成对 {submission.student.real_name} 作业的批改')
         return redirect('core:assignment_result', assignment_id=assignment.id)
     
-    # 获取题目、学生答案和已有得分
+    # 获取题目、学生答案和已有得分（已有得分一次查出）
+    question_scores = {
+        question_score.question_id: question_score
+        for question_score in QuestionScore.objects.filter(submission=submission)
+    }
     questions_with_data = []
     for question in assignment.questions.all().order_by('order'):
         student_answer = submission.get_answer(question.id)
         
-        # 获取已有的得分记录
-        try:
-            question_score = QuestionScore.objects.get(submission=submission, question=question)
-            current_score = question_score.score
-            current_comment = question_score.teacher_comment
-        except QuestionScore.DoesNotExist:
-            current_score = 0
-            current_comment = ''
+        question_score = question_scores.get(question.id)
+        current_score = question_score.score if question_score else 0
+        current_comment = question_score.teacher_comment if question_score else ''
         
         questions_with_data.append({
             'question': question,
@@ -2155,197 +2410,204 @@ def assignment_export_page(request, assignment_id):
         'assignment': assignment,
         'stats': stats,
         'graded_submissions': graded_submissions,
+        'export_formats': ExportJob.FORMAT_CHOICES,
     }
     
     return render(request, 'core/assignments/export.html', context)
 
 
-@login_required
-def assignment_export_excel(request, assignment_id):
-    """导出CSV格式（Excel兼容）"""
+def _exportable_assignment(request, assignment_id):
+    """导出前的检查：返回 (作业, None) 或 (None, 错误响应)"""
     if request.user.user_type != 'teacher':
-        return JsonResponse({'error': '只有教师可以导出作业'}, status=403)
+        return None, JsonResponse({'error': '只有教师可以导出作业'}, status=403)
     
-    assignment = get_object_or_404(Assignment, id=assignment_id, created_by=request.user)
-    
-    # 检查是否有已批改的提交
-    graded_count = assignment.studentsubmission_set.filter(
-        is_submitted=True, is_graded=True
-    ).count()
-    
-    if graded_count == 0:
-        return JsonResponse({'error': '该作业暂无已批改的提交记录，无法导出'}, status=400)
-    
-    # 简化的CSV导出
-    import csv
-    import io
-    
-    # 创建CSV内容
-    output = io.StringIO()
-    writer = csv.writer(output)
+    assignment = get_object_or_404(
+        Assignment.objects.select_related('teaching_class', 'created_by'),
+        id=assignment_id, created_by=request.user
+    )
     
-    # 写入标题信息
-    writer.writerow([f'作业：{assignment.title}'])
-    writer.writerow([f'教学班：{assignment.teaching_class.name}'])
-    writer.writerow([f'导出时间：{timezone.now().strftime("%Y-%m-%d %H:%M:%S")}'])
-    writer.writerow([])  # 空行
+    if not assignment.studentsubmission_set.filter(is_submitted=True, is_graded=True).exists():
+        return None, JsonResponse({'error': '该作业暂无已批改的提交记录，无法导出'}, status=400)
     
-    # 写入表头
-    writer.writerow([
-        '序号', '学号', '姓名', '总分', '得分', '得分率(%)', 
-        '提交时间', '批改时间', '批改教师', '是否逾期', '教师评语'
-    ])
+    return assignment, None
+
+
+@login_required
+def assignment_export_excel(request, assignment_id):
+    """导出Excel格式（.xlsx，汇总表 + 学生×题目得分矩阵）"""
+    assignment, error = _exportable_assignment(request, assignment_id)
+    if error:
+        return error
     
-    # 写入数据
-    submissions = assignment.studentsubmission_set.filter(
-        is_submitted=True, is_graded=True
-    ).select_related('student', 'graded_by')
+    # 逐行写出工作表并边压缩边发送，内存占用与提交数量无关
+    response = StreamingHttpResponse(iter_gradebook_xlsx(assignment), content_type=XLSX_CONTENT_TYPE)
+    filename = f"{assignment.title}_作业存档_{timezone.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    response['Content-Disposition'] = content_disposition_header(True, filename)
     
-    for idx, submission in enumerate(submissions, 1):
-        try:
-            student_id = submission.student.studentprofile.student_id if hasattr(submission.student, 'studentprofile') else submission.student.username
-        except:
-            student_id = submission.student.username
-            
-        writer.writerow([
-            idx,
-            student_id,
-            submission.student.real_name,
-            assignment.total_score,
-            submission.score or 0,
-            submission.score_percentage or 0,
-            submission.submit_time.strftime('%Y-%m-%d %H:%M'),
-            submission.graded_at.strftime('%Y-%m-%d %H:%M') if submission.graded_at else '',
-            submission.graded_by.real_name if submission.graded_by else '',
-            '是' if submission.is_late else '否',
-            submission.teacher_comments or ''
-        ])
-    
-    # 创建HTTP响应
-    response = HttpResponse(
-        output.getvalue().encode('utf-8-sig'),  # 使用UTF-8 BOM确保Excel正确显示中文
-        content_type='text/csv'
+    return response
+
+
+@login_required
+def assignment_export_csv(request, assignment_id):
+    """导出CSV格式"""
+    assignment, error = _exportable_assignment(request, assignment_id)
+    if error:
+        return error
+    
+    # 逐行生成并流式发送，内存占用与提交数量无关
+    response = StreamingHttpResponse(
+        iter_gradebook_csv(assignment),  # 首行带 UTF-8 BOM，确保Excel正确显示中文
+        content_type='text/csv; charset=utf-8'
     )
     filename = f"{assignment.title}_作业存档_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
     
     return response
 
 
 @login_required
 def assignment_export_json(request, assignment_id):
-    """导出JSON格式"""
-    if request.user.user_type != 'teacher':
-        return JsonResponse({'error': '只有教师可以导出作业'}, status=403)
+    """导出JSON格式（?format=jsonl 时导出 JSON Lines）"""
+    assignment, error = _exportable_assignment(request, assignment_id)
+    if error:
+        return error
+    
+    # 作业信息、题目之后逐条写出提交记录，不在内存中组装整份数据
+    if request.GET.get('format') == 'jsonl':
+        content, content_type, extension = iter_archive_jsonl(assignment), 'application/x-ndjson', 'jsonl'
+    else:
+        content, content_type, extension = iter_archive_json(assignment), 'application/json', 'json'
     
-    assignment = get_object_or_404(Assignment, id=assignment_id, created_by=request.user)
+    response = StreamingHttpResponse(content, content_type=f'{content_type}; charset=utf-8')
+    filename = f"{assignment.title}_数据备份_{timezone.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    response['Content-Disposition'] = content_disposition_header(True, filename)
     
-    # 检查是否有已批改的提交
-    graded_count = assignment.studentsubmission_set.filter(
-        is_submitted=True, is_graded=True
-    ).count()
+    return response
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+def class_export_archive(request, class_id):
+    """下载教学班全部作业的存档（zip，每个作业一份 CSV 和 JSON），按内容版本缓存"""
+    if request.user.user_type != 'teacher':
+        messages.error(request, '只有教师可以导出作业')
+        return redirect('core:assignment_index')
     
-    if graded_count == 0:
-        return JsonResponse({'error': '该作业暂无已批改的提交记录，无法导出'}, status=400)
+    teaching_class = get_object_or_404(TeachingClass, id=class_id, created_by=request.user)
+    assignments, version = class_archive(teaching_class)
+    if version is None:
+        messages.error(request, f'教学班「{teaching_class.name}」暂无已批改的作业，无法导出')
+        return redirect('core:class_management')
     
-    # 简化的JSON导出
-    import json
+    etag = quote_etag(version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
     
-    submissions = assignment.studentsubmission_set.filter(
-        is_submitted=True, is_graded=True
-    ).select_related('student', 'graded_by').prefetch_related('question_scores')
-    
-    data = {
-        'assignment': {
-            'id': assignment.id,
-            'title': assignment.title,
-            'description': assignment.description,
-            'teaching_class': assignment.teaching_class.name,
-            'chapter': assignment.chapter,
-            'total_score': assignment.total_score,
-            'publish_time': assignment.publish_time.isoformat(),
-            'due_time': assignment.due_time.isoformat(),
-            'created_by': assignment.created_by.real_name,
-            'export_time': timezone.now().isoformat(),
-        },
-        'questions': [],
-        'submissions': []
+    cache = ArchiveCache(teaching_class.id, version)
+    filename = f"{teaching_class.name}_作业存档_{version[:8]}.zip"
+    try:
+        # 内容未变化：直接发送已生成的存档
+        response = FileResponse(cache.open(), as_attachment=True, filename=filename)
+    except FileNotFoundError:
+        # 尚未生成（或刚被并发请求的 prune 删除）：逐个作业生成并压缩发送，同时写入缓存供下次下载
+        response = StreamingHttpResponse(
+            cache.tee(iter_zip(iter_class_archive_members(assignments))),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['ETag'] = etag
+    return response
+
+
+def export_job_payload(job):
+    """导出任务的状态数据（AJAX）"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'export_format': job.export_format,
+        'target': job.target_name,
+        'error': job.error_message,
+        'download_url': reverse('core:export_job_download', args=[job.id]) if job.status == 'done' else None,
     }
+
+
+def _queue_export_job(request, **target):
+    """创建导出任务；同一目标和格式已有未完成的任务时直接返回该任务"""
+    export_format = request.POST.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'success': False, 'message': '不支持的导出格式'}, status=400)
+    
+    job = ExportJob.objects.filter(
+        created_by=request.user, export_format=export_format, status__in=['queued', 'running'], **target
+    ).first()
+    if job is None:
+        job = ExportJob.objects.create(created_by=request.user, export_format=export_format, **target)
+    return JsonResponse({'success': True, 'job': export_job_payload(job)})
+
+
+@login_required
+@require_POST
+def assignment_export_job_create(request, assignment_id):
+    """提交单个作业的后台导出任务（AJAX）"""
+    assignment, error = _exportable_assignment(request, assignment_id)
+    if error:
+        return error
+    return _queue_export_job(request, assignment=assignment)
+
+
+@login_required
+@require_POST
+def class_export_job_create(request, class_id):
+    """提交教学班全部作业的后台打包导出任务（AJAX）"""
+    if request.user.user_type != 'teacher':
+        return JsonResponse({'error': '只有教师可以导出作业'}, status=403)
     
-    # 导出题目
-    for question in assignment.questions.all().order_by('order'):
-        data['questions'].append({
-            'id': question.id,
-            'order': question.order,
-            'content': question.content,
-            'question_type': question.question_type,
-            'difficulty': question.difficulty,
-            'options': question.options,
-            'correct_answer': question.correct_answer,
-            'explanation': question.explanation,
-            'score': question.score,
-        })
-    
-    # 导出提交记录
-    for submission in submissions:
-        try:
-            student_id = submission.student.studentprofile.student_id if hasattr(submission.student, 'studentprofile') else submission.student.username
-        except:
-            student_id = submission.student.username
-            
-        submission_data = {
-            'student': {
-                'id': submission.student.id,
-                'student_id': student_id,
-                'real_name': submission.student.real_name,
-            },
-            'answers': submission.answers,
-            'score': submission.score,
-            'submit_time': submission.submit_time.isoformat(),
-            'is_late': submission.is_late,
-            'teacher_comments': submission.teacher_comments,
-            'graded_by': submission.graded_by.real_name if submission.graded_by else None,
-            'graded_at': submission.graded_at.isoformat() if submission.graded_at else None,
-            'question_scores': []
-        }
-        
-        # 导出题目得分
-        for question_score in submission.question_scores.all():
-            submission_data['question_scores'].append({
-                'question_id': question_score.question.id,
-                'score': question_score.score,
-                'teacher_comment': question_score.teacher_comment,
-            })
-        
-        data['submissions'].append(submission_data)
-    
-    # 创建HTTP响应
-    response = HttpResponse(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        content_type='application/json'
+    teaching_class = get_object_or_404(TeachingClass, id=class_id, created_by=request.user)
+    if not exportable_assignments(teaching_class).exists():
+        return JsonResponse({'error': '该教学班暂无已批改的作业，无法导出'}, status=400)
+    return _queue_export_job(request, teaching_class=teaching_class)
+
+
+@login_required
+def export_job_download(request, job_id):
+    """下载已完成的导出任务文件"""
+    job = get_object_or_404(
+        ExportJob.objects.select_related('assignment', 'teaching_class'),
+        id=job_id, created_by=request.user, status='done'
     )
-    filename = f"{assignment.title}_数据备份_{timezone.now().strftime('%Y%m%d_%H%M%S')}.json"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    if not job.output_file:
+        raise Http404('导出文件不存在')
+    return FileResponse(job.output_file.open('rb'), as_attachment=True, filename=job.download_filename)
 
 
 @login_required
 def assignment_export_status(request, assignment_id):
-    """获取作业导出状态（AJAX）"""
+    """获取作业导出状态（AJAX）；?job=<任务ID> 时返回该任务，否则返回本作业最近一次导出任务"""
     if request.user.user_type != 'teacher':
         return JsonResponse({'error': '权限不足'}, status=403)
     
     assignment = get_object_or_404(Assignment, id=assignment_id, created_by=request.user)
     
-    total_submissions = assignment.studentsubmission_set.filter(is_submitted=True).count()
-    graded_submissions = assignment.studentsubmission_set.filter(
-        is_submitted=True, is_graded=True
-    ).count()
+    counts = assignment.studentsubmission_set.filter(is_submitted=True).aggregate(
+        total=models.Count('id'),
+        graded=models.Count('id', filter=models.Q(is_graded=True)),
+    )
+    total_submissions, graded_submissions = counts['total'], counts['graded']
+    
+    jobs = ExportJob.objects.filter(created_by=request.user).select_related('assignment', 'teaching_class')
+    job_id = request.GET.get('job', '')
+    if job_id.isdigit():
+        job = jobs.filter(pk=job_id).first()
+    else:
+        job = jobs.filter(assignment=assignment).first()
     
     return JsonResponse({
         'can_export': graded_submissions > 0,
         'total_submissions': total_submissions,
         'graded_submissions': graded_submissions,
         'grading_progress': round((graded_submissions / total_submissions * 100) if total_submissions > 0 else 0, 1),
+        'job': export_job_payload(job) if job else None,
     })
@@ -0,0 +1,179 @@
+"""
+流式 XLSX 写入
+
+.xlsx 是一个 zip 包，工作表是其中的 XML 文件。这里借助 ZipStream 边写边取：
+逐行生成工作表 XML、边压缩边把已生成的字节交给调用方，
+不需要第三方工作簿库，也不在内存中保留整张表。
+
+单元格一律使用内联字符串（inlineStr），无需共享字符串表；字符串按原样保存，
+学号等以 0 开头的编号不会被 Excel 当作数字。
+
+用法：
+
+    writer = StreamingXLSXWriter()
+    yield from writer.write_sheet('成绩', rows)
+    yield from writer.finish()
+"""
+import math
+import re
+from xml.sax.saxutils import escape, quoteattr
+
+from .zipstream import ZipStream
+
+CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 每积累多少行写入一次压缩流
+ROW_BATCH = 200
+# 压缩级别越低速度越快，XML 重复度高，1 级已能压缩到原来的十分之一左右
+COMPRESS_LEVEL = 1
+
+# XML 1.0 不允许的控制字符
+ILLEGAL_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+SHEET_FOOTER = '</sheetData></worksheet>'
+
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+
+def column_letter(index):
+    """列序号（从 0 开始）转为列字母：0 -> A，26 -> AA"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def cell_xml(reference, value):
+    """单个单元格的 XML；数字写为数值，其余写为内联字符串，空值和 NaN、无穷大不输出"""
+    if type(value) is int:
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if type(value) is float:
+        # <v>nan</v>、<v>inf</v> 不是合法数值，Excel 会提示文件损坏
+        return f'<c r="{reference}"><v>{value}</v></c>' if math.isfinite(value) else ''
+    if value is None or value == '':
+        return ''
+    text = escape(ILLEGAL_XML_CHARS_RE.sub('', str(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class StreamingXLSXWriter:
+    """逐行写出工作簿；write_sheet 和 finish 都是生成器，产出压缩后的字节块"""
+
+    def __init__(self, compresslevel=COMPRESS_LEVEL):
+        self._zip = ZipStream(compresslevel=compresslevel)
+        self._sheets = []
+        self._columns = []
+
+    def _letters(self, count):
+        while len(self._columns) < count:
+            self._columns.append(column_letter(len(self._columns)))
+        return self._columns
+
+    def _drain(self, force=False):
+        data = self._zip.drain(force)
+        if data:
+            yield data
+
+    def write_sheet(self, title, rows, position=None):
+        """
+        写出一张工作表，rows 为逐行的值列表。
+        position 指定工作表在工作簿中的顺序（默认按写入顺序），
+        可以先写需要遍历数据的表，再写依赖其统计结果的表。
+        """
+        number = len(self._sheets) + 1
+        self._sheets.append((len(self._sheets) if position is None else position, number, title))
+        with self._zip.open(f'xl/worksheets/sheet{number}.xml') as sheet:
+            # zip 文件头立即发出，不必等第一批数据压缩完成
+            yield from self._drain(force=True)
+            pending = [SHEET_HEADER]
+            for row_number, row in enumerate(rows, 1):
+                row = list(row)
+                letters = self._letters(len(row))
+                cells = ''.join([
+                    cell_xml(f'{letters[index]}{row_number}', value) for index, value in enumerate(row)
+                ])
+                pending.append(f'<row r="{row_number}">{cells}</row>')
+                if len(pending) >= ROW_BATCH:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    yield from self._drain()
+            pending.append(SHEET_FOOTER)
+            sheet.write(''.join(pending).encode('utf-8'))
+        yield from self._drain()
+
+    def finish(self):
+        """写出工作簿结构文件和 zip 目录，产出剩余的字节"""
+        sheets = sorted(self._sheets)
+        self._write('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for _, number, _ in sheets
+            )
+            + '</Types>'
+        ))
+        self._write('_rels/.rels', ROOT_RELS)
+        self._write('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(
+                f'<sheet name={quoteattr(title)} sheetId="{number}" r:id="rId{number}"/>'
+                for _, number, title in sheets
+            )
+            + '</sheets></workbook>'
+        ))
+        self._write('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{number}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{number}.xml"/>'
+                for _, number, _ in sheets
+            )
+            + f'<Relationship Id="rId{len(sheets) + 1}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+        self._write('xl/styles.xml', STYLES)
+        yield self._zip.close()
+
+    def _write(self, name, content):
+        self._zip.writestr(name, content.encode('utf-8'))
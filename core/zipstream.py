@@ -0,0 +1,81 @@
+"""
+流式 zip 写入
+
+用标准库 zipfile 向一个只进不退的缓冲区写 zip：zipfile 检测到输出不可 seek 时，
+改为在每个文件数据之后写数据描述符，因此无需预先知道文件大小，也不需要临时文件。
+写入过程中随时可以取走已生成的字节，交给 StreamingHttpResponse 或写入文件。
+"""
+import zipfile
+
+from django.utils import timezone
+
+# 缓冲区积累到该大小后交给调用方
+FLUSH_SIZE = 64 * 1024
+
+
+class _Output:
+    """只支持 write 的缓冲区"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class ZipStream:
+    """边写边取的 zip 包；同一时间只能有一个文件处于写入状态"""
+
+    def __init__(self, compression=zipfile.ZIP_DEFLATED, compresslevel=None):
+        self._output = _Output()
+        self._zip = zipfile.ZipFile(self._output, 'w', compression=compression, compresslevel=compresslevel)
+
+    def open(self, name, stored=False):
+        """打开一个待写入的文件，返回可 write 的对象（用 with 关闭）；stored 为 True 时不压缩"""
+        if stored:
+            info = zipfile.ZipInfo(name, date_time=timezone.localtime().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            return self._zip.open(info, 'w')
+        return self._zip.open(name, 'w')
+
+    def writestr(self, name, data):
+        self._zip.writestr(name, data)
+
+    def drain(self, force=False):
+        """取走已生成的字节；不足 FLUSH_SIZE 且未指定 force 时返回空字节串"""
+        if self._output.size and (force or self._output.size >= FLUSH_SIZE):
+            return self._output.drain()
+        return b''
+
+    def close(self):
+        """写出 zip 目录，返回剩余的字节"""
+        self._zip.close()
+        return self._output.drain()
+
+
+def iter_zip(members):
+    """把 (文件名, 字节块迭代器) 逐个写入 zip，逐块产出压缩后的字节；xlsx 本身已压缩，直接存储"""
+    stream = ZipStream()
+    for name, chunks in members:
+        with stream.open(name, stored=name.endswith('.xlsx')) as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = stream.drain()
+                if data:
+                    yield data
+        data = stream.drain(force=True)
+        if data:
+            yield data
+    yield stream.close()